@@ -1,12 +1,21 @@
+from io import BytesIO
+
 import streamlit as st
 import pandas as pd
 
 from ui import inject_css, hero, stepper, metric_pair
 from mfm.synthetic import make_synthetic_bundle
-from mfm.ai_assist import suggest_dataset_type, suggest_column_mapping, suggest_process_type
-from mfm.model import build_flow_model, compute_balances, build_sankey_inputs
-from mfm.viz import render_sankey, render_energy, render_circularity
-from mfm.report import build_pdf_report
+from mfm.ai_assist import detect_dataset_type, suggest_column_mapping, suggest_process_type
+from mfm.model import (
+    build_flow_model, compute_baseline, apply_scenario, build_sankey_inputs,
+    compute_period_baseline, apply_period_scenario, build_scenario_lattice,
+    attach_column_plan, attach_time_index, time_index_bounds, baseline_for_range,
+)
+from mfm.profiling import StageProfiler
+from mfm.mapping_store import MappingStore
+from mfm.ingest import (
+    ParsedFileCache, content_hash, canonicalize_bundle, is_workbook, mapped_read_args, stream_bundle,
+)
 
 st.set_page_config(page_title="Inshira • Material Flow Mapping", layout="wide")
 inject_css()
@@ -22,9 +31,90 @@ if "scope" not in st.session_state:
     }
 if "process_blocks" not in st.session_state: st.session_state.process_blocks = []
 if "bundle" not in st.session_state: st.session_state.bundle = None
+if "baseline_cache" not in st.session_state: st.session_state.baseline_cache = None
+if "upload_hashes" not in st.session_state: st.session_state.upload_hashes = {}
+if "canonical_key" not in st.session_state: st.session_state.canonical_key = None
+if "report_pdf" not in st.session_state: st.session_state.report_pdf = None
 
 def goto(n: int): st.session_state.step = n
 
+UPLOAD_CACHE_MB = 1024
+STREAM_AUTO_MB = 200  # uploads above this default to streaming ingest
+
+@st.cache_resource
+def get_mapping_store():
+    return MappingStore()
+
+def confirm_data(to_learn):
+    store = get_mapping_store()
+    for columns, dtype, mapping in to_learn:
+        store.remember(columns, dtype, mapping)
+    goto(4)
+
+@st.cache_resource
+def get_upload_cache():
+    # One parsed-upload cache per process, shared by every session
+    return ParsedFileCache(budget_bytes=UPLOAD_CACHE_MB * 1024 * 1024)
+
+DEFAULT_SCENARIOS = {"scrap_reduction_pct": 0.0, "yield_improve_pct": 0.0, "energy_intensity_improve_pct": 0.0, "allocate_energy": False}
+
+@st.cache_resource
+def get_demo_bundle():
+    # Demo data is identical for everyone: build it (and its time index) once per process.
+    # Sessions share this object, so nothing downstream may modify it in place.
+    bundle = make_synthetic_bundle()
+    attach_column_plan(bundle)
+    attach_time_index(bundle)
+    return bundle
+
+@st.cache_resource(max_entries=32)
+def get_demo_baseline(key, _model):
+    # Shared per process for the demo bundle; keyed like the session baseline cache
+    baseline = compute_baseline(_model)
+    return {"baseline": baseline, "default_results": apply_scenario(baseline, DEFAULT_SCENARIOS)}
+
+def get_baseline(model, profile=False):
+    # Baseline aggregates only depend on the bundle, blocks and boundary — reuse them across slider moves
+    key = (
+        model["boundary_start"], model["boundary_end"],
+        tuple(tuple(sorted(b.items())) for b in model["blocks"]),
+        profile,
+    )
+    cached = st.session_state.baseline_cache
+    if cached is None or cached["bundle"] is not model["data"] or cached["key"] != key:
+        shared = None
+        if model["data"] is get_demo_bundle() and not profile:
+            shared = get_demo_baseline(key, model)
+            baseline = shared["baseline"]
+        else:
+            prof = StageProfiler(trace_memory=False) if profile else None
+            baseline = compute_baseline(model, prof)
+            if prof is not None:
+                prof.close()
+        cached = {"bundle": model["data"], "key": key, "baseline": baseline, "shared": shared}
+        st.session_state.baseline_cache = cached
+    return cached["baseline"]
+
+def get_period_baseline(model):
+    # Lives next to the cached baseline, so it is rebuilt exactly when that is
+    periods = st.session_state.baseline_cache.setdefault("periods", {})
+    if model["time_period"] not in periods:
+        periods[model["time_period"]] = compute_period_baseline(model)
+    return periods[model["time_period"]]
+
+LATTICE_CACHE_SIZE = 3  # analysis windows kept per session; dragging the window evicts the oldest
+
+def get_lattice(baseline, window):
+    # Most recently used windows only, dropped together with the cached baseline
+    lattices = st.session_state.baseline_cache.setdefault("lattices", {})
+    lattice = lattices.pop(window, None)
+    if lattice is None:
+        lattice = build_scenario_lattice(baseline)
+    lattices[window] = lattice
+    while len(lattices) > LATTICE_CACHE_SIZE:
+        del lattices[next(iter(lattices))]
+    return lattice
+
 # ---------- sidebar ----------
 with st.sidebar:
     st.markdown("### Workspace")
@@ -38,19 +128,7 @@ with st.sidebar:
         label_visibility="collapsed"
     )
 
-    st.markdown("---")
-    st.markdown("### Scenarios")
-    scrap_reduction = st.slider("Scrap / waste reduction (%)", 0, 30, 0, 1)
-    yield_improve = st.slider("Yield improvement (%)", 0, 15, 0, 1)
-    energy_improve = st.slider("Energy intensity improvement (%)", 0, 20, 0, 1)
-    allocate_energy = st.toggle("Allocate site energy to processes", value=False)
-
-    scenarios = {
-        "scrap_reduction_pct": float(scrap_reduction),
-        "yield_improve_pct": float(yield_improve),
-        "energy_intensity_improve_pct": float(energy_improve),
-        "allocate_energy": bool(allocate_energy),
-    }
+    st.caption("Scenario controls are on the Insights step.")
 
     st.markdown("---")
     demo_mode = st.toggle("Demo mode (synthetic data)", value=True)
@@ -68,6 +146,165 @@ hero(
 stepper(st.session_state.step)
 st.write("")
 
+# ---------- insights (fragment) ----------
+SCENARIO_DEFAULTS = {"scn_scrap": 0, "scn_yield": 0, "scn_energy": 0, "scn_alloc": False}
+if "scenario_values" not in st.session_state: st.session_state.scenario_values = dict(SCENARIO_DEFAULTS)
+
+def scenario_controls():
+    # Widget state is dropped on steps that don't render these controls, so restore it from scenario_values
+    saved = st.session_state.scenario_values
+    for k, v in saved.items():
+        if k not in st.session_state:
+            st.session_state[k] = v
+    st.markdown("<div class='card'>", unsafe_allow_html=True)
+    st.markdown("**Scenarios**  \n<span class='small'>Only this panel recomputes when you move a slider.</span>", unsafe_allow_html=True)
+    c1, c2, c3, c4 = st.columns(4)
+    scrap_reduction = c1.slider("Scrap / waste reduction (%)", 0, 30, step=1, key="scn_scrap")
+    yield_improve = c2.slider("Yield improvement (%)", 0, 15, step=1, key="scn_yield")
+    energy_improve = c3.slider("Energy intensity improvement (%)", 0, 20, step=1, key="scn_energy")
+    allocate_energy = c4.toggle("Allocate site energy to processes", key="scn_alloc")
+    st.markdown("</div>", unsafe_allow_html=True)
+    for k in saved:
+        saved[k] = st.session_state[k]
+
+    return {
+        "scrap_reduction_pct": float(scrap_reduction),
+        "yield_improve_pct": float(yield_improve),
+        "energy_intensity_improve_pct": float(energy_improve),
+        "allocate_energy": bool(allocate_energy),
+    }
+
+@st.fragment
+def insights(scope):
+    # Heavy modules (plotly, reportlab) are only imported once a session reaches this step
+    from mfm.viz import render_sankey, render_energy, render_circularity
+    from mfm.report import build_pdf_report, report_cache_key
+
+    scenarios = scenario_controls()
+
+    model = build_flow_model(
+        site_name=scope["site_name"],
+        boundary_start=scope["boundary_start"],
+        boundary_end=scope["boundary_end"],
+        process_blocks=st.session_state.process_blocks,
+        data_bundle=st.session_state.bundle,
+        time_period=scope["time_period"],
+        scenarios=scenarios,
+    )
+    profile = st.session_state.get("profile_stages", False)
+    baseline = get_baseline(model, profile)
+
+    # Date window: totals come from the bundle's prefix-sum index, so narrowing is constant-time
+    time_index = attach_time_index(st.session_state.bundle)
+    bounds = time_index_bounds(time_index)
+    if bounds and bounds[0].date() < bounds[1].date():
+        lo, hi = bounds[0].date(), bounds[1].date()
+        window = st.slider("Analysis window", min_value=lo, max_value=hi, value=(lo, hi), format="YYYY-MM-DD")
+        if window != (lo, hi):
+            baseline = baseline_for_range(baseline, time_index, *window)
+        else:
+            window = None
+    else:
+        window = None
+
+    lattice = get_lattice(baseline, window) if st.session_state.get("scenario_lattice", False) else None
+    prof = StageProfiler(trace_memory=False) if profile else None
+    shared = st.session_state.baseline_cache["shared"]
+    if shared is not None and window is None and scenarios == DEFAULT_SCENARIOS:
+        results = shared["default_results"]
+    else:
+        results = apply_scenario(baseline, scenarios, prof, lattice)
+    if prof is not None:
+        prof.close()
+        results["perf"] = ([dict(r, part="baseline (cached)") for r in baseline.get("perf", [])]
+                           + [dict(r, part="scenario") for r in results["perf"]])
+    sankey = build_sankey_inputs(results)
+
+    top = st.columns([2.1, 1], gap="large")
+    with top[0]:
+        st.markdown("<div class='card'>", unsafe_allow_html=True)
+        st.markdown("**Material flow map**")
+        fig = render_sankey(sankey, title=f"{scope['site_name']} — {scope['boundary_start']} → {scope['boundary_end']}")
+        st.plotly_chart(fig, use_container_width=True)
+        st.markdown("</div>", unsafe_allow_html=True)
+
+    with top[1]:
+        st.markdown("<div class='card'>", unsafe_allow_html=True)
+        st.markdown("**Highlights**  \n<span class='small'>Live-updating with scenarios.</span>", unsafe_allow_html=True)
+
+        metric_pair("Material in (kg)", f"{results['mat_in_kg']:,.0f}",
+                    "Product out (kg)", f"{results['prod_out_kg']:,.0f}")
+        st.write("")
+        metric_pair("Waste out (kg)", f"{results['waste_out_kg']:,.0f}",
+                    "Efficiency (%)", f"{results['material_eff_pct']:.1f}")
+
+        st.markdown("<div class='divider'></div>", unsafe_allow_html=True)
+        st.markdown("**AI assist**")
+        if results.get("ai_messages"):
+            for m in results["ai_messages"][:4]:
+                st.write(f"• {m}")
+        else:
+            st.write("• No flags yet — try changing scenarios.")
+
+        st.markdown("<div class='divider'></div>", unsafe_allow_html=True)
+        # The PDF is only built on request and reused until results or scope change
+        report_key = report_cache_key(scope["site_name"], scope["boundary_start"], scope["boundary_end"], results)
+        cached_pdf = st.session_state.report_pdf
+        if cached_pdf is None or cached_pdf["key"] != report_key:
+            cached_pdf = None
+            if st.button("📄 Prepare report (PDF)", use_container_width=True):
+                with st.spinner("Building report…"):
+                    pdf = build_pdf_report(scope["site_name"], scope["boundary_start"], scope["boundary_end"], results)
+                cached_pdf = st.session_state.report_pdf = {"key": report_key, "pdf": pdf}
+        if cached_pdf is not None:
+            st.download_button("⬇️ Download report (PDF)", data=cached_pdf["pdf"], file_name="inshira_material_flow_report.pdf", mime="application/pdf", use_container_width=True)
+        st.markdown("</div>", unsafe_allow_html=True)
+
+    st.write("")
+    t1, t2, t3, t4 = st.tabs(["Energy", "Circular economy", "By period", "Assumptions & transparency"])
+    with t1:
+        st.markdown("<div class='card'>", unsafe_allow_html=True)
+        st.markdown("**Energy usage**")
+        render_energy(results)
+        st.markdown("</div>", unsafe_allow_html=True)
+
+    with t2:
+        st.markdown("<div class='card'>", unsafe_allow_html=True)
+        st.markdown("**Circular economy**")
+        render_circularity(results)
+        st.markdown("</div>", unsafe_allow_html=True)
+
+    with t3:
+        st.markdown("<div class='card'>", unsafe_allow_html=True)
+        st.markdown(f"**Balances by {scope['time_period'].lower()}**")
+        periods = apply_period_scenario(get_period_baseline(model), scenarios)
+        st.dataframe(periods["period_table"], use_container_width=True)
+        for a in periods["assumptions"]:
+            st.caption(f"• {a}")
+        st.markdown("</div>", unsafe_allow_html=True)
+
+    with t4:
+        st.markdown("<div class='card'>", unsafe_allow_html=True)
+        st.markdown("**Assumptions & data gaps**")
+        for a in results.get("assumptions", []):
+            st.write(f"• {a}")
+        st.markdown("<div class='divider'></div>", unsafe_allow_html=True)
+        st.markdown("**Computed flows**")
+        st.dataframe(results["flows_table"], use_container_width=True)
+        st.markdown("</div>", unsafe_allow_html=True)
+
+    st.write("")
+    with st.expander("Performance"):
+        st.toggle("Record stage timings", key="profile_stages")
+        st.toggle("Precompute scenario lattice", key="scenario_lattice",
+                  help="Evaluate every slider combination once per dataset and analysis window; slider moves become lookups.")
+        if results.get("perf"):
+            st.dataframe(pd.DataFrame(results["perf"]), use_container_width=True)
+            st.caption("Baseline stages are timed when the baseline is built and reused until data or blocks change.")
+        else:
+            st.caption("Enable to record wall time and row counts per model stage. Memory is not traced here because all sessions share one process.")
+
+
 # ---------- STEP 1 ----------
 if st.session_state.step == 1:
     c1, c2 = st.columns([2, 1], gap="large")
@@ -171,8 +408,9 @@ elif st.session_state.step == 3:
     st.markdown("**Add data**  \n<span class='small'>Use demo data for presentations, or upload CSV/XLSX. AI suggests dataset type + column mapping for confirmation.</span>", unsafe_allow_html=True)
 
     if demo_mode:
-        bundle = make_synthetic_bundle()
+        bundle = get_demo_bundle()
         st.session_state.bundle = bundle
+        st.session_state.canonical_key = None
         t1,t2,t3,t4 = st.tabs(["Production","Materials","Energy","Waste"])
         t1.dataframe(bundle["production_output"], use_container_width=True)
         t2.dataframe(bundle["material_purchases"], use_container_width=True)
@@ -180,27 +418,66 @@ elif st.session_state.step == 3:
         t4.dataframe(bundle["waste_summary"], use_container_width=True)
     else:
         uploads = st.file_uploader("Upload files", type=["csv","xlsx"], accept_multiple_files=True)
-        parsed = []
+        # Sizes are known before anything is parsed: switch large new uploads to streaming up front
+        if any(f.size > STREAM_AUTO_MB * 1024 * 1024 and f.file_id not in st.session_state.upload_hashes for f in uploads or []):
+            st.session_state.stream_ingest = True
+        stream = st.toggle("Streaming ingest (large files)", key="stream_ingest",
+                           help="Read uploads in chunks and keep only per-day totals plus a preview, instead of every row.")
+        parsed, to_learn = [], []
+        cache = get_upload_cache()
+        hashes = st.session_state.upload_hashes
         for f in uploads or []:
-            df = pd.read_csv(f) if f.name.lower().endswith(".csv") else pd.read_excel(f)
-            parsed.append((f.name, df))
+            # Hash each upload once per session; the parse itself is shared across reruns and sessions
+            data = f.getbuffer()
+            if f.file_id not in hashes:
+                hashes[f.file_id] = content_hash(data)
+            if is_workbook(f.name):
+                # Each sheet is a dataset of its own; the workbook is read once, all sheets together
+                for sheet, sdf in cache.get_sheets(f.name, data, hashes[f.file_id]).items():
+                    parsed.append((f"{f.name} › {sheet}", hashes[f.file_id], sdf, sdf))
+                continue
+            # Type and mapping are suggested from a preview; the full parse waits for the confirmed mapping
+            parsed.append((f.name, hashes[f.file_id], cache.get_preview(f.name, data, hashes[f.file_id]), data))
 
         if parsed:
-            bundle = {}
-            for name, df in parsed:
-                dtype = suggest_dataset_type(name, df)
+            store = get_mapping_store()
+            raw, sources, mappings, key = {}, [], {}, [stream]
+            for name, digest, df, data in parsed:
                 st.subheader(name)
-                st.caption(f"AI suggests: {dtype}")
-                dtype_confirm = st.selectbox(f"Confirm type for {name}",
-                    ["production_output","material_purchases","energy_site","waste_summary"],
-                    index=["production_output","material_purchases","energy_site","waste_summary"].index(dtype)
-                )
-                mapping = suggest_column_mapping(dtype_confirm, df)
-                st.caption("AI column mapping suggestion (you can adjust later):")
-                st.json(mapping)
-                bundle[dtype_confirm] = df
+                learned = store.lookup(df.columns)
+                if learned:
+                    # Same export format as a confirmed earlier upload: no detection, no confirmation
+                    dtype_confirm, mapping = learned
+                    st.caption(f"Recognised format: {dtype_confirm}, using the mapping you confirmed before.")
+                    st.button("Forget this format", key=f"forget_{name}", on_click=store.forget, args=(list(df.columns),))
+                else:
+                    dtype, confidence, _ = detect_dataset_type(name.rsplit(" › ", 1)[-1], df)
+                    st.caption(f"AI suggests: {dtype} ({confidence:.0%} confidence)")
+                    dtype_confirm = st.selectbox(f"Confirm type for {name}",
+                        ["production_output","material_purchases","energy_site","waste_summary"],
+                        index=["production_output","material_purchases","energy_site","waste_summary"].index(dtype)
+                    )
+                    mapping = suggest_column_mapping(dtype_confirm, df)
+                    st.caption("AI column mapping suggestion (you can adjust later):")
+                    st.json(mapping)
+                    to_learn.append((list(df.columns), dtype_confirm, mapping))
+                if isinstance(data, pd.DataFrame):
+                    raw[dtype_confirm] = data
+                elif not stream:
+                    usecols, dtypes = mapped_read_args(dtype_confirm, mapping, df.columns)
+                    raw[dtype_confirm] = cache.get_or_parse(name, data, digest, usecols, dtypes)
+                sources.append((dtype_confirm, name, data if isinstance(data, pd.DataFrame) else BytesIO(data)))
+                mappings[dtype_confirm] = mapping
+                key.append((dtype_confirm, name, digest, tuple(mapping.items())))
                 st.dataframe(df.head(15), use_container_width=True)
-            st.session_state.bundle = bundle
+            # Sessions keep only the compact canonical frames; rebuilt when a file, type or mapping changes
+            key = tuple(key)
+            if st.session_state.canonical_key != key:
+                if stream:
+                    st.session_state.bundle = stream_bundle(sources, mappings=mappings)
+                else:
+                    st.session_state.bundle = canonicalize_bundle(raw, mappings)
+                st.session_state.canonical_key = key
         else:
             st.info("Upload at least one file to continue.")
 
@@ -209,7 +486,9 @@ elif st.session_state.step == 3:
     with nav1:
         st.button("← Back", use_container_width=True, on_click=goto, args=(2,))
     with nav2:
-        st.button("Continue →", type="primary", use_container_width=True, disabled=st.session_state.bundle is None, on_click=goto, args=(4,))
+        # Continuing confirms the shown types and mappings; they are remembered for the next upload
+        st.button("Continue →", type="primary", use_container_width=True, disabled=st.session_state.bundle is None,
+                  on_click=confirm_data, args=([] if demo_mode else to_learn,))
     st.markdown("</div>", unsafe_allow_html=True)
 
 # ---------- STEP 4 ----------
@@ -219,72 +498,7 @@ else:
         st.error("Missing process map or data. Go back to previous steps.")
         st.stop()
 
-    model = build_flow_model(
-        site_name=scope["site_name"],
-        boundary_start=scope["boundary_start"],
-        boundary_end=scope["boundary_end"],
-        process_blocks=st.session_state.process_blocks,
-        data_bundle=st.session_state.bundle,
-        time_period=scope["time_period"],
-        scenarios=scenarios,
-    )
-    results = compute_balances(model)
-    sankey = build_sankey_inputs(results)
-
-    top = st.columns([2.1, 1], gap="large")
-    with top[0]:
-        st.markdown("<div class='card'>", unsafe_allow_html=True)
-        st.markdown("**Material flow map**")
-        fig = render_sankey(sankey, title=f"{scope['site_name']} — {scope['boundary_start']} → {scope['boundary_end']}")
-        st.plotly_chart(fig, use_container_width=True)
-        st.markdown("</div>", unsafe_allow_html=True)
-
-    with top[1]:
-        st.markdown("<div class='card'>", unsafe_allow_html=True)
-        st.markdown("**Highlights**  \n<span class='small'>Live-updating with scenarios.</span>", unsafe_allow_html=True)
-
-        metric_pair("Material in (kg)", f"{results['mat_in_kg']:,.0f}",
-                    "Product out (kg)", f"{results['prod_out_kg']:,.0f}")
-        st.write("")
-        metric_pair("Waste out (kg)", f"{results['waste_out_kg']:,.0f}",
-                    "Efficiency (%)", f"{results['material_eff_pct']:.1f}")
-
-        st.markdown("<div class='divider'></div>", unsafe_allow_html=True)
-        st.markdown("**AI assist**")
-        if results.get("ai_messages"):
-            for m in results["ai_messages"][:4]:
-                st.write(f"• {m}")
-        else:
-            st.write("• No flags yet — try changing scenarios.")
-
-        st.markdown("<div class='divider'></div>", unsafe_allow_html=True)
-        pdf = build_pdf_report(scope["site_name"], scope["boundary_start"], scope["boundary_end"], results, sankey_fig=fig)
-        st.download_button("⬇️ Download report (PDF)", data=pdf, file_name="inshira_material_flow_report.pdf", mime="application/pdf", use_container_width=True)
-        st.markdown("</div>", unsafe_allow_html=True)
-
-    st.write("")
-    t1, t2, t3 = st.tabs(["Energy", "Circular economy", "Assumptions & transparency"])
-    with t1:
-        st.markdown("<div class='card'>", unsafe_allow_html=True)
-        st.markdown("**Energy usage**")
-        render_energy(results)
-        st.markdown("</div>", unsafe_allow_html=True)
-
-    with t2:
-        st.markdown("<div class='card'>", unsafe_allow_html=True)
-        st.markdown("**Circular economy**")
-        render_circularity(results)
-        st.markdown("</div>", unsafe_allow_html=True)
-
-    with t3:
-        st.markdown("<div class='card'>", unsafe_allow_html=True)
-        st.markdown("**Assumptions & data gaps**")
-        for a in results.get("assumptions", []):
-            st.write(f"• {a}")
-        st.markdown("<div class='divider'></div>", unsafe_allow_html=True)
-        st.markdown("**Computed flows**")
-        st.dataframe(results["flows_table"], use_container_width=True)
-        st.markdown("</div>", unsafe_allow_html=True)
+    insights(scope)
 
     st.write("")
     st.button("← Back to data", on_click=goto, args=(3,))
@@ -0,0 +1,134 @@
+"""Benchmark the compute → sankey → report pipeline.
+
+Runs compute_balances, build_sankey_inputs, render_sankey and
+build_pdf_report for every combination of bundle size and process-map size,
+recording best-of-N wall time and peak traced memory per stage.
+
+    python benchmarks/bench_pipeline.py                 # run and compare with baseline.json
+    python benchmarks/bench_pipeline.py --save          # store current numbers as the baseline
+    python benchmarks/bench_pipeline.py --sizes small medium --blocks 5 50
+
+Exit code is 1 when any stage is slower or heavier than the stored baseline
+by more than --tolerance. Everything runs offline: the report stage draws the
+vector Sankey by default; --image measures the kaleido raster path instead.
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from mfm.synthetic import make_synthetic_bundle, make_large_synthetic_bundle
+from mfm.ai_assist import suggest_process_type
+from mfm.model import build_flow_model, compute_balances, build_sankey_inputs
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+SIZES = {
+    "small": lambda: make_synthetic_bundle(),
+    "medium": lambda: make_large_synthetic_bundle(n_production_rows=100_000, days=90, seed=1),
+    "huge": lambda: make_large_synthetic_bundle(n_production_rows=2_000_000, n_products=20, n_materials=8,
+                                                n_waste_types=12, days=365, seed=2),
+}
+
+LIBRARY = ["Material Intake", "Cutting", "Forming", "Welding / Joining", "Surface Treatment",
+           "Assembly", "Inspection", "Packaging & Dispatch"]
+
+def make_blocks(n):
+    blocks = []
+    for i in range(n):
+        name = LIBRARY[i % len(LIBRARY)]
+        label = name if i < len(LIBRARY) else f"{name} {i // len(LIBRARY) + 1}"
+        blocks.append({"name": name, "user_label": label, "type": suggest_process_type(name),
+                       "yield_pct": 92, "primary_material": "Mild steel sheet 2mm", "throughput_unit": "kg"})
+    return blocks
+
+def measure(fn, repeats):
+    # Best-of-N wall time; peak memory from one traced run so tracing overhead doesn't skew timings
+    best = float("inf")
+    out = None
+    for _ in range(repeats):
+        gc.collect()
+        t = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t)
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, {"wall_s": best, "peak_mb": peak / 1e6}
+
+def run(sizes, block_counts, repeats, sankey_mode):
+    from mfm.viz import render_sankey
+    from mfm.report import build_pdf_report
+
+    results = {}
+    scenarios = {"scrap_reduction_pct": 10.0, "yield_improve_pct": 5.0,
+                 "energy_intensity_improve_pct": 5.0, "allocate_energy": True}
+    for size in sizes:
+        bundle = SIZES[size]()
+        for n in block_counts:
+            model = build_flow_model("Bench site", "Goods In", "Dispatch", make_blocks(n), bundle, "Quarter", scenarios)
+            res, m1 = measure(lambda: compute_balances(model), repeats)
+            sankey, m2 = measure(lambda: build_sankey_inputs(res), repeats)
+            fig, m3 = measure(lambda: render_sankey(sankey), repeats)
+            _, m4 = measure(lambda: build_pdf_report("Bench site", "Goods In", "Dispatch", res,
+                                                     sankey_fig=fig, sankey_mode=sankey_mode), repeats)
+            for stage, m in [("compute_balances", m1), ("build_sankey_inputs", m2),
+                             ("render_sankey", m3), ("build_pdf_report", m4)]:
+                key = f"{size}/{n}/{stage}"
+                results[key] = m
+                print(f"{key:<40} {m['wall_s'] * 1000:10.2f} ms {m['peak_mb']:10.2f} MB", flush=True)
+    return results
+
+def compare(results, baseline, tolerance, min_wall_s=0.005):
+    # Tiny stages are noise-dominated: only flag time regressions above min_wall_s
+    failures = []
+    for key, m in results.items():
+        ref = baseline.get(key)
+        if ref is None:
+            continue
+        if m["wall_s"] > max(ref["wall_s"], min_wall_s) * (1 + tolerance):
+            failures.append(f"{key}: wall {m['wall_s'] * 1000:.2f} ms vs baseline {ref['wall_s'] * 1000:.2f} ms")
+        if m["peak_mb"] > max(ref["peak_mb"], 1.0) * (1 + tolerance):
+            failures.append(f"{key}: peak {m['peak_mb']:.2f} MB vs baseline {ref['peak_mb']:.2f} MB")
+    return failures
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", nargs="+", default=list(SIZES), choices=list(SIZES))
+    ap.add_argument("--blocks", nargs="+", type=int, default=[5, 50, 500])
+    ap.add_argument("--repeats", type=int, default=3)
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown/growth (default 0.25)")
+    ap.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    ap.add_argument("--save", action="store_true", help="write results as the new baseline")
+    ap.add_argument("--image", action="store_true", help="embed a kaleido-rendered Sankey instead of the vector one")
+    args = ap.parse_args(argv)
+
+    results = run(args.sizes, args.blocks, args.repeats, sankey_mode="image" if args.image else "vector")
+
+    if args.save:
+        stored = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        stored.update(results)
+        args.baseline.write_text(json.dumps(stored, indent=2, sort_keys=True))
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --save to create one.")
+        return 0
+    failures = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+    if failures:
+        print("\nREGRESSIONS:")
+        for f in failures:
+            print(f"  {f}")
+        return 1
+    print("\nNo regressions against baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,6 +7,11 @@ This package contains:
 - mass-balance model + scenario logic
 - visualisation helpers
 - PDF report generator
+- optional per-stage profiling
+- upload parsing + content-hash cache
+- persistent figure renderer for image export
+- headless batch report generation
+- on-disk memory of confirmed column mappings
 """
 
 __all__ = [
@@ -15,4 +20,9 @@ __all__ = [
     "model",
     "viz",
     "report",
+    "profiling",
+    "ingest",
+    "render",
+    "batch",
+    "mapping_store",
 ]
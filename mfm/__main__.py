@@ -0,0 +1,105 @@
+"""Headless model run: python -m mfm INPUT... --process-map map.json [outputs]
+
+INPUT is a CSV/XLSX/Parquet file or a directory of them (see
+mfm.ingest.load_bundle). Results go to stdout as JSON unless --json,
+--csv or --pdf say otherwise. Only pandas/numpy are imported up front;
+reportlab is loaded when --pdf is requested, streamlit and plotly never.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from .ingest import load_bundle, load_process_map
+from .model import (build_flow_model, compute_baseline, apply_scenario,
+                    build_time_index, time_index_bounds, baseline_for_range)
+
+def _jsonable(v):
+    if isinstance(v, pd.DataFrame):
+        return json.loads(v.to_json(orient="records"))
+    if hasattr(v, "tolist"):
+        return v.tolist()
+    if isinstance(v, dict):
+        return {k: _jsonable(x) for k, x in v.items()}
+    if isinstance(v, (list, tuple)):
+        return [_jsonable(x) for x in v]
+    return v
+
+def results_to_dict(results):
+    return {k: _jsonable(v) for k, v in results.items()}
+
+def write_csvs(results, out_dir):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    scalars = {k: v for k, v in results.items() if isinstance(v, (int, float)) and not isinstance(v, bool)}
+    pd.DataFrame([scalars]).to_csv(out_dir / "kpis.csv", index=False)
+    for key, name in [("flows_table", "flows"), ("waste_by_type", "waste_by_type"), ("energy_alloc_table", "energy_alloc")]:
+        if results.get(key) is not None:
+            results[key].to_csv(out_dir / f"{name}.csv", index=False)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m mfm", description="Run the material flow model without the app.")
+    ap.add_argument("inputs", nargs="+", help="data files or directories")
+    ap.add_argument("--process-map", required=True, help="process map JSON (list of blocks or object with blocks)")
+    ap.add_argument("--site-name")
+    ap.add_argument("--scrap-reduction", type=float, help="scrap / waste reduction (%%)")
+    ap.add_argument("--yield-improve", type=float, help="yield improvement (%%)")
+    ap.add_argument("--energy-improve", type=float, help="energy intensity improvement (%%)")
+    ap.add_argument("--allocate-energy", action="store_true", help="allocate site energy to processes")
+    ap.add_argument("--start", help="restrict totals to dates from this day (inclusive)")
+    ap.add_argument("--end", help="restrict totals to dates up to this day (inclusive)")
+    ap.add_argument("--json", help="write results JSON to this path ('-' for stdout)")
+    ap.add_argument("--csv", help="write kpis/flows/waste/energy CSVs into this directory")
+    ap.add_argument("--pdf", help="write the PDF report to this path")
+    ap.add_argument("--chunksize", type=int, help="stream inputs in chunks of this many rows, keeping only aggregates")
+    ap.add_argument("--sheet-workers", type=int, help="read the sheets of each workbook in this many processes")
+    args = ap.parse_args(argv)
+
+    spec = load_process_map(args.process_map)
+    scenarios = dict(spec.get("scenarios", {}))
+    for key, val in [("scrap_reduction_pct", args.scrap_reduction), ("yield_improve_pct", args.yield_improve),
+                     ("energy_intensity_improve_pct", args.energy_improve)]:
+        if val is not None:
+            scenarios[key] = val
+    if args.allocate_energy:
+        scenarios["allocate_energy"] = True
+
+    bundle = load_bundle(args.inputs, args.chunksize, spec.get("columns"), sheet_workers=args.sheet_workers)
+    site_name = args.site_name or spec.get("site_name", "Site")
+    model = build_flow_model(
+        site_name=site_name,
+        boundary_start=spec.get("boundary_start", "Goods In (Raw Material)"),
+        boundary_end=spec.get("boundary_end", "Dispatch (Finished Goods)"),
+        process_blocks=spec["blocks"],
+        data_bundle=bundle,
+        time_period=spec.get("time_period", "Quarter"),
+        scenarios=scenarios,
+    )
+    baseline = compute_baseline(model)
+    if args.start or args.end:
+        time_index = build_time_index(bundle)
+        bounds = time_index_bounds(time_index)
+        if bounds is None:
+            ap.error("--start/--end given but no dataset has a date column")
+        baseline = baseline_for_range(baseline, time_index,
+                                      pd.Timestamp(args.start) if args.start else bounds[0],
+                                      pd.Timestamp(args.end) if args.end else bounds[1])
+    results = apply_scenario(baseline, scenarios)
+
+    if args.csv:
+        write_csvs(results, args.csv)
+    if args.pdf:
+        from .report import build_pdf_report
+        Path(args.pdf).write_bytes(build_pdf_report(site_name, model["boundary_start"], model["boundary_end"], results))
+    if args.json or not (args.csv or args.pdf):
+        text = json.dumps(results_to_dict(results), indent=2, default=str)
+        if not args.json or args.json == "-":
+            print(text)
+        else:
+            Path(args.json).write_text(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,37 +1,87 @@
-import re
+import pandas as pd
 
-def suggest_dataset_type(filename, df):
+from .model import resolve_columns
+
+DETECT_SAMPLE_ROWS = 500  # value statistics never look further than this
+
+def _numeric_median(df, keys):
+    cols = [c for c in df.columns if any(k in str(c).lower() for k in keys)]
+    vals = pd.concat([pd.to_numeric(df[c], errors="coerce") for c in cols]) if cols else pd.Series(dtype=float)
+    vals = vals.dropna().abs()
+    return float(vals.median()) if len(vals) else None
+
+def _date_stats(df):
+    # (share of sample rows with a readable date, median step in days) for the first date-like column
+    for c in df.columns:
+        if not any(k in str(c).lower() for k in ("date", "time", "day", "month", "period", "week")):
+            continue
+        s = df[c]
+        if not pd.api.types.is_datetime64_any_dtype(s):
+            s = pd.to_datetime(s.astype(str), errors="coerce", format="mixed")
+        ok = s.dropna()
+        if len(ok) < 2:
+            return len(ok) / max(len(df), 1), None
+        steps = ok.sort_values().diff().dropna()
+        steps = steps[steps > pd.Timedelta(0)]
+        return len(ok) / len(df), (steps.median() / pd.Timedelta(days=1) if len(steps) else None)
+    return 0.0, None
+
+def detect_dataset_type(filename, sample):
+    """Score the dataset types from a filename, the headers and a bounded row sample.
+
+    Returns (type, confidence, scores); confidence is the winning type's share
+    of the evidence, 0 when nothing matched (production_output is the fallback).
+    """
+    sample = sample.head(DETECT_SAMPLE_ROWS)
     name = filename.lower()
-    cols = " ".join([c.lower() for c in df.columns])
+    cols = " ".join([str(c).lower() for c in sample.columns])
+    scores = dict.fromkeys(["production_output", "material_purchases", "energy_site", "waste_summary"], 0.0)
+
+    # Filename and header keywords (the rules suggest_dataset_type always used)
+    if "kwh" in cols or "electric" in cols or "gas" in cols:
+        scores["energy_site"] += 3
+    if "energy" in name:
+        scores["energy_site"] += 2
+    if "disposal" in cols or "waste type" in cols:
+        scores["waste_summary"] += 3
+    if "waste" in name:
+        scores["waste_summary"] += 2
+    if "material" in cols and ("kg" in cols or "weight" in cols):
+        scores["material_purchases"] += 2.5
+    if "purchase" in name:
+        scores["material_purchases"] += 2
+    if any(k in cols for k in ("qty", "produced", "quantity")) and "kg" not in cols:
+        scores["production_output"] += 2
+    if "production" in name or "output" in name:
+        scores["production_output"] += 1
+
+    # Value statistics from the sample
+    kwh = _numeric_median(sample, ["kwh", "electric", "gas"])
+    kg = _numeric_median(sample, ["kg", "weight"])
+    if kwh is not None and (kg is None or kwh > kg):
+        scores["energy_site"] += 0.5  # metered kWh usually dwarfs per-row kg
+    if kg is not None and kwh is None:
+        scores["material_purchases" if kg >= 1000 else "waste_summary"] += 0.5
+    density, step = _date_stats(sample)
+    if density >= 0.8 and step is not None:
+        if step < 1:
+            scores["energy_site"] += 1  # interval meter readings
+        elif step < 7:
+            scores["production_output"] += 1  # daily production batches
+    if len(sample) and sample.astype(str).apply(lambda c: c.str.lower().isin(["recycling", "landfill", "reuse"]).any()).any():
+        scores["waste_summary"] += 1
 
-    if "kwh" in cols or "electric" in cols or "gas" in cols or "energy" in name:
-        return "energy_site"
-    if "waste" in name or "disposal" in cols or "waste type" in cols:
-        return "waste_summary"
-    if "purchase" in name or "material" in cols and ("kg" in cols or "weight" in cols):
-        return "material_purchases"
-    return "production_output"
+    best = max(scores, key=scores.get) if any(scores.values()) else "production_output"
+    total = sum(scores.values())
+    return best, (scores[best] / total if total else 0.0), scores
+
+def suggest_dataset_type(filename, df):
+    # df only needs the headers plus a few rows; a preview sample is enough
+    return detect_dataset_type(filename, df)[0]
 
 def suggest_column_mapping(dataset_type, df):
-    cols = [c for c in df.columns]
-    low = {c.lower(): c for c in cols}
-
-    def pick(*keys):
-        for k in keys:
-            for lc, orig in low.items():
-                if k in lc:
-                    return orig
-        return None
-
-    if dataset_type == "production_output":
-        return {"date": pick("date"), "qty": pick("qty", "quantity", "produced"), "unit": pick("unit"), "product": pick("product")}
-    if dataset_type == "material_purchases":
-        return {"period": pick("month", "period"), "material": pick("material"), "mass_kg": pick("kg", "weight")}
-    if dataset_type == "energy_site":
-        return {"period": pick("month", "period"), "electricity_kwh": pick("electric", "kwh"), "gas_kwh": pick("gas")}
-    if dataset_type == "waste_summary":
-        return {"waste_type": pick("waste"), "mass_kg": pick("kg", "quantity"), "route": pick("route", "disposal")}
-    return {}
+    # Same resolution the model uses
+    return resolve_columns(dataset_type, df)
 
 def suggest_process_type(label):
     s = label.lower()
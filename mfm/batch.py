@@ -0,0 +1,127 @@
+"""Headless batch report generation for many sites.
+
+    python -m mfm.batch SITES_DIR OUT_DIR [--process-map map.json] [--start 2025-02-01 --end 2025-02-28] [--workers N]
+
+Every subdirectory of SITES_DIR is one site bundle (CSV/XLSX/Parquet files,
+see mfm.ingest.load_bundle_dir) with an optional process_map.json; sites
+without one use --process-map. Sites run in a process pool; each writes its
+PDF to OUT_DIR and one row to OUT_DIR/index.csv. A failing site is recorded
+as an error row and never stops the rest.
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import pandas as pd
+
+from .ingest import load_bundle_dir, load_process_map
+from .model import (build_flow_model, compute_baseline, apply_scenario,
+                    build_time_index, time_index_bounds, baseline_for_range)
+
+KPI_COLUMNS = ["mat_in_kg", "prod_out_kg", "waste_out_kg", "unaccounted_kg", "material_eff_pct",
+               "waste_intensity", "energy_intensity_kwh_per_kg", "diversion_pct"]
+
+def run_site(site_dir, out_dir, default_map=None, start=None, end=None, chunksize=None):
+    """Model + PDF for one site directory; always returns a summary row."""
+    from .report import build_pdf_report
+
+    site_dir, out_dir = Path(site_dir), Path(out_dir)
+    row = {"site": site_dir.name, "site_name": site_dir.name, "status": "error", "pdf": "", "error": ""}
+    try:
+        map_path = site_dir / "process_map.json"
+        if not map_path.exists():
+            if default_map is None:
+                raise FileNotFoundError("no process_map.json and no --process-map given")
+            map_path = Path(default_map)
+        spec = load_process_map(map_path)
+        # already inside a pool worker: read workbook sheets in this process
+        bundle = load_bundle_dir(site_dir, chunksize, spec.get("columns"), sheet_workers=1)
+        site_name = spec.get("site_name", site_dir.name)
+        row["site_name"] = site_name
+        model = build_flow_model(
+            site_name=site_name,
+            boundary_start=spec.get("boundary_start", "Goods In (Raw Material)"),
+            boundary_end=spec.get("boundary_end", "Dispatch (Finished Goods)"),
+            process_blocks=spec["blocks"],
+            data_bundle=bundle,
+            time_period=spec.get("time_period", "Quarter"),
+            scenarios=spec.get("scenarios", {}),
+        )
+        baseline = compute_baseline(model)
+        suffix = ""
+        if start or end:
+            time_index = build_time_index(bundle)
+            bounds = time_index_bounds(time_index)
+            if bounds is None:
+                raise ValueError("date range requested but no dated datasets found")
+            lo = pd.Timestamp(start) if start else bounds[0]
+            hi = pd.Timestamp(end) if end else bounds[1]
+            baseline = baseline_for_range(baseline, time_index, lo, hi)
+            suffix = f"_{lo:%Y%m%d}-{hi:%Y%m%d}"
+        results = apply_scenario(baseline, model["scenarios"])
+
+        pdf = build_pdf_report(site_name, model["boundary_start"], model["boundary_end"], results)
+        pdf_path = out_dir / f"{site_dir.name}{suffix}.pdf"
+        pdf_path.write_bytes(pdf)
+        row.update({k: results[k] for k in KPI_COLUMNS})
+        row.update({"status": "ok", "pdf": str(pdf_path)})
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    return row
+
+def run_batch(sites_dir, out_dir, default_map=None, start=None, end=None, workers=None, chunksize=None):
+    """Run every site in a process pool and write OUT_DIR/index.csv; returns the index DataFrame."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    sites = sorted(p for p in Path(sites_dir).iterdir() if p.is_dir())
+    args = (out_dir, default_map, start, end, chunksize)
+    rows = {}
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as ex:
+            futures = {ex.submit(run_site, s, *args): s for s in sites}
+            for fut in as_completed(futures):
+                try:
+                    rows[futures[fut]] = fut.result()
+                except BrokenProcessPool:
+                    pass  # retried in isolation below
+    except BrokenProcessPool:
+        pass
+
+    # A hard worker crash takes the whole pool down; rerun what's left one site per process
+    for s in sites:
+        if s in rows:
+            continue
+        try:
+            with ProcessPoolExecutor(max_workers=1) as ex:
+                rows[s] = ex.submit(run_site, s, *args).result()
+        except BrokenProcessPool as e:
+            rows[s] = {"site": s.name, "site_name": s.name, "status": "error", "pdf": "", "error": f"worker crashed: {e}"}
+
+    index = pd.DataFrame([rows[s] for s in sites], columns=["site", "site_name", "status", "pdf", "error"] + KPI_COLUMNS)
+    index.to_csv(out_dir / "index.csv", index=False)
+    return index
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Generate one PDF report per site directory.")
+    ap.add_argument("sites_dir")
+    ap.add_argument("out_dir")
+    ap.add_argument("--process-map", help="process map JSON for sites without their own process_map.json")
+    ap.add_argument("--start", help="restrict totals to dates from this day (inclusive)")
+    ap.add_argument("--end", help="restrict totals to dates up to this day (inclusive)")
+    ap.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    ap.add_argument("--chunksize", type=int, help="stream site files in chunks of this many rows, keeping only aggregates")
+    args = ap.parse_args(argv)
+
+    index = run_batch(args.sites_dir, args.out_dir, args.process_map, args.start, args.end, args.workers, args.chunksize)
+    ok = int((index["status"] == "ok").sum())
+    print(f"{ok}/{len(index)} site reports written to {args.out_dir}")
+    for _, r in index[index["status"] != "ok"].iterrows():
+        print(f"  {r['site']}: {r['error']}", file=sys.stderr)
+    return 0 if ok == len(index) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,445 @@
+import hashlib
+import json
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .ai_assist import suggest_dataset_type, suggest_column_mapping, suggest_process_type
+from .model import (
+    COLUMN_KEYWORDS, _month_labels, _parse_periods, attach_column_plan, column_fallbacks, resolve_columns,
+)
+
+DATASET_TYPES = ["production_output", "material_purchases", "energy_site", "waste_summary"]
+DATA_SUFFIXES = (".csv", ".xlsx", ".parquet")
+
+def content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+def parse_upload(name: str, data: bytes, usecols=None, dtype=None) -> pd.DataFrame:
+    """Parse an uploaded file, optionally only the usecols columns (see mapped_read_args).
+
+    Column-restricted CSVs go through the pyarrow engine with explicit
+    dtypes; if that fails (pyarrow missing, text in a numeric column, ...)
+    the default parser reads the file and the columns are selected after.
+    """
+    buf = BytesIO(data)
+    low = name.lower()
+    if low.endswith(".csv"):
+        if usecols is not None:
+            try:
+                return pd.read_csv(buf, engine="pyarrow", usecols=usecols, dtype=dtype)
+            except (ImportError, ValueError, TypeError):
+                buf = BytesIO(data)
+        df = pd.read_csv(buf)
+        return df if usecols is None else df[usecols]
+    if low.endswith(".parquet"):
+        return pd.read_parquet(buf, columns=usecols)
+    df = first_sheet(data)
+    return df if usecols is None else df[usecols]
+
+# ---------- Excel ----------
+
+def _sheet_frame(ws, max_rows=None):
+    rows = ws.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return pd.DataFrame()
+    columns = [str(h) if h is not None else f"Unnamed: {i}" for i, h in enumerate(header)]
+    df = pd.DataFrame.from_records(list(islice(rows, max_rows)), columns=columns).dropna(how="all")
+    # trailing formatted-but-empty columns come back unnamed and all-None
+    empty = [c for c, h in zip(columns, header) if h is None and df[c].isna().all()]
+    return df.drop(columns=empty).reset_index(drop=True)
+
+def _read_sheets(data, titles, max_rows=None):
+    from openpyxl import load_workbook
+    wb = load_workbook(BytesIO(data), read_only=True, data_only=True)
+    try:
+        return [_sheet_frame(wb[t], max_rows) for t in titles]
+    finally:
+        wb.close()
+
+def _workbook_bytes(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    if hasattr(source, "read"):
+        return source.read()
+    return Path(source).read_bytes()
+
+def _sheet_titles(data):
+    from openpyxl import load_workbook
+    wb = load_workbook(BytesIO(data), read_only=True)
+    try:
+        return wb.sheetnames
+    finally:
+        wb.close()
+
+def read_excel_sheets(source, max_workers=None) -> dict:
+    """Every non-empty sheet of a workbook as {sheet title: DataFrame}.
+
+    openpyxl's read-only mode streams rows instead of building the full
+    object model. Sheets are read one after another unless max_workers asks
+    for a pool; its workers are spawned (never forked from a threaded
+    server) and each opens the workbook once for its share of the sheets.
+    """
+    data = _workbook_bytes(source)
+    titles = _sheet_titles(data)
+    workers = min(len(titles), max_workers or 1)
+    if workers <= 1:
+        frames = dict(zip(titles, _read_sheets(data, titles)))
+    else:
+        groups = [titles[i::workers] for i in range(workers)]
+        frames = {}
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as ex:
+            for group, dfs in zip(groups, ex.map(_read_sheets, [data] * workers, groups)):
+                frames.update(zip(group, dfs))
+    return {t: frames[t] for t in titles if not frames[t].empty}
+
+def first_sheet(source, max_rows=None) -> pd.DataFrame:
+    data = _workbook_bytes(source)
+    return _read_sheets(data, _sheet_titles(data)[:1], max_rows)[0]
+
+def is_workbook(name) -> bool:
+    return name.lower().endswith(".xlsx")
+
+def read_table(path) -> pd.DataFrame:
+    path = Path(path)
+    low = path.name.lower()
+    if low.endswith(".csv"):
+        return pd.read_csv(path)
+    if low.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return first_sheet(path)
+
+def _file_tables(f, sheet_workers=None):
+    # (label, exact type names, table or path) per table: each sheet of a workbook, else the file itself
+    if not is_workbook(f.name):
+        return [(f.name, [f.stem], f)]
+    sheets = read_excel_sheets(f, sheet_workers)
+    stem = [f.stem] if len(sheets) == 1 else []
+    return [(title, [title] + stem, df) for title, df in sheets.items()]
+
+def _dataset_type(label, exact, df):
+    # A file stem or sheet title naming a dataset type (e.g. energy_site) wins over detection
+    return next((n for n in exact if n in DATASET_TYPES), None) or suggest_dataset_type(label, df)
+
+def load_bundle(paths, chunksize=None, columns=None, sheet_workers=None) -> dict:
+    """Read CSV/XLSX/Parquet files (or every such file in a directory) into a data bundle.
+
+    Every sheet of a workbook is a table of its own. A file or sheet named
+    after a dataset type (e.g. energy_site.csv) is used as that type;
+    anything else goes through suggest_dataset_type. columns holds
+    per-dataset {role: header} overrides of the detected columns (as in a
+    process map). With chunksize the files are streamed into compact
+    aggregates instead (see stream_bundle), mapped with the same overrides.
+    sheet_workers is passed to read_excel_sheets as max_workers.
+    """
+    columns = columns or {}
+    files = []
+    for p in map(Path, paths):
+        files.extend(f for f in (sorted(p.iterdir()) if p.is_dir() else [p]) if f.suffix.lower() in DATA_SUFFIXES)
+    tables = [t for f in files for t in _file_tables(f, sheet_workers)]
+    if chunksize:
+        typed, mappings = [], {}
+        for label, exact, src in tables:
+            head = src.head(PREVIEW_ROWS) if isinstance(src, pd.DataFrame) else read_preview(src.name, src)
+            dtype = _dataset_type(label, exact, head)
+            typed.append((dtype, label, src))
+            # overrides name the original headers, so they are resolved before canonicalizing renames them
+            mappings[dtype] = resolve_columns(dtype, head, columns.get(dtype))
+        return stream_bundle(typed, chunksize, mappings)
+    bundle = {}
+    for label, exact, src in tables:
+        df = src if isinstance(src, pd.DataFrame) else read_table(src)
+        bundle[_dataset_type(label, exact, df)] = df
+    attach_column_plan(bundle, columns)
+    return bundle
+
+def load_bundle_dir(path, chunksize=None, columns=None, sheet_workers=None) -> dict:
+    return load_bundle([path], chunksize, columns, sheet_workers)
+
+# Canonical column kinds per dataset; column names are the suggest_column_mapping keys
+CANONICAL_SCHEMA = {
+    "production_output": {"date": "period", "qty": "count", "unit": "category", "product": "category"},
+    "material_purchases": {"period": "period", "material": "category", "mass_kg": "float"},
+    "energy_site": {"period": "period", "electricity_kwh": "float", "gas_kwh": "float"},
+    "waste_summary": {"period": "period", "waste_type": "category", "mass_kg": "float", "route": "category"},
+}
+PASSTHROUGH_COLUMNS = {"site_id": "category"}
+
+def _compact_numeric(series, kind):
+    values = pd.to_numeric(series, errors="coerce")
+    v = values.to_numpy(dtype=float)
+    if kind == "count" and np.isfinite(v).all() and (v % 1 == 0).all() \
+            and np.abs(v).max(initial=0) <= np.iinfo(np.int32).max:
+        return values.astype(np.int32)
+    return values.astype(np.float32)
+
+def _compact_period(series, year):
+    # Month labels stay monthly (period[M]) so per-period views keep spreading them by day;
+    # anything finer becomes datetime64. Month names without a given year stay categorical
+    # labels, so the model places them (and says so) once it sees every dataset.
+    if isinstance(series.dtype, pd.PeriodDtype) or pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if year is None and _month_labels(series):
+        return series.astype("category")
+    periods, native = _parse_periods(series, year)
+    return periods if native == "M" else periods.dt.start_time
+
+# Parse-time dtypes per schema kind; periods are left to the parser and canonicalize
+_READ_DTYPES = {"float": "float64", "count": "float64", "category": "category"}
+
+def mapped_read_args(dataset_type, mapping, header):
+    """usecols and dtype for reading only the mapped (and passthrough) columns of a file."""
+    schema = CANONICAL_SCHEMA[dataset_type]
+    usecols, dtype = [], {}
+    for role, col in mapping.items():
+        if col is None or col not in header or col in usecols:
+            continue
+        usecols.append(col)
+        if schema.get(role) in _READ_DTYPES:
+            dtype[col] = _READ_DTYPES[schema[role]]
+    for col, kind in PASSTHROUGH_COLUMNS.items():
+        if col in header and col not in usecols:
+            usecols.append(col)
+            dtype[col] = kind
+    return usecols, dtype
+
+def canonicalize(dataset_type, df, mapping=None, year=None) -> pd.DataFrame:
+    """Rename mapped columns to the canonical schema and store them compactly.
+
+    mapping is the confirmed suggest_column_mapping result (suggested when
+    omitted). Quantities become int32 when integral, masses and energy
+    float32, labels categorical and date/month columns datetime64 or
+    period[M] (month names only with year, else categorical). Unmapped
+    columns are dropped, except a site_id column.
+    """
+    schema = CANONICAL_SCHEMA[dataset_type]
+    mapping = suggest_column_mapping(dataset_type, df) if mapping is None else mapping
+    out = {}
+    used = set()
+    for name, kind in schema.items():
+        src = mapping.get(name)
+        # a source column fills one canonical column only (e.g. a lone kWh column is not also gas)
+        if src is None or src not in df.columns or src in used:
+            continue
+        used.add(src)
+        col = df[src]
+        if kind == "period":
+            out[name] = _compact_period(col, year)
+        elif kind == "category":
+            out[name] = col.astype("category")
+        else:
+            out[name] = _compact_numeric(col, kind)
+    for name, kind in PASSTHROUGH_COLUMNS.items():
+        if name in df.columns and name not in out:
+            out[name] = df[name].astype(kind)
+    return pd.DataFrame(out, index=df.index).reset_index(drop=True)
+
+def canonicalize_bundle(bundle, mappings=None, year=None) -> dict:
+    """canonicalize every dataset in a bundle.
+
+    Month-name labels ("Jan") carry no year: they become period[M] only
+    with an explicit year and otherwise stay labels for the model to place.
+    """
+    used = {name: (mappings or {}).get(name) or suggest_column_mapping(name, df)
+            for name, df in bundle.items() if name in CANONICAL_SCHEMA}
+    out = {name: canonicalize(name, bundle[name], mapping, year) for name, mapping in used.items()}
+    out["column_plan"] = _canonical_plan(out, used)
+    return out
+
+def _canonical_plan(bundle, mappings):
+    # Canonical headers are the role names, so the column plan needs no detection;
+    # fallbacks are judged on the source headers the mappings name
+    return {name: {**{role: role if role in df.columns else None for role in COLUMN_KEYWORDS[name]},
+                   "fallback": column_fallbacks(name, mappings[name])}
+            for name, df in bundle.items() if name in CANONICAL_SCHEMA}
+
+# ---------- Streaming ingest ----------
+
+STREAM_CHUNK_ROWS = 250_000
+PREVIEW_ROWS = 200
+
+def iter_chunks(name, source, chunksize=STREAM_CHUNK_ROWS):
+    """Yield DataFrames of at most chunksize rows from a CSV/Parquet path or buffer
+    (or a DataFrame already in memory).
+
+    A workbook's first sheet is read whole and comes back as one chunk.
+    """
+    low = name.lower()
+    if isinstance(source, pd.DataFrame):
+        # an already-read table, e.g. a workbook sheet
+        for i in range(0, len(source), chunksize):
+            yield source.iloc[i:i + chunksize]
+    elif low.endswith(".csv"):
+        with pd.read_csv(source, chunksize=chunksize) as reader:
+            yield from reader
+    elif low.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield first_sheet(source)
+
+def read_preview(name, source, rows=PREVIEW_ROWS) -> pd.DataFrame:
+    """Header plus at most rows rows, without reading the rest of the file.
+
+    Enough for detect_dataset_type and the mapping suggestion, so both are
+    available before deciding how (or whether) to parse the whole file.
+    """
+    if is_workbook(name) and not isinstance(source, pd.DataFrame):
+        chunk = first_sheet(source, max_rows=rows)
+    else:
+        chunk = next(iter_chunks(name, source, rows), pd.DataFrame())
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return chunk.head(rows)
+
+def _aggregate(df):
+    # Sum the numeric columns per combination of the label / period columns
+    keys = [c for c in df.columns if not pd.api.types.is_numeric_dtype(df[c])]
+    values = [c for c in df.columns if c not in keys]
+    sums = df[values].astype(float)
+    if not keys:
+        return sums.sum().to_frame().T
+    sums[keys] = df[keys]
+    return sums.groupby(keys, observed=True, dropna=False, sort=False)[values].sum().reset_index()
+
+def stream_table(name, source, dataset_type, mapping=None, year=None, chunksize=STREAM_CHUNK_ROWS):
+    """Stream one file into running aggregates; returns (aggregate, preview, rows read).
+
+    Each chunk is canonicalized, timestamps are floored to the day and the
+    numeric columns are summed per day / month, label (material, waste
+    type, route, product, ...) and site. Only that running aggregate and the
+    first PREVIEW_ROWS raw rows are kept, so memory follows chunksize and the
+    number of distinct keys rather than file size. Every total, per-period,
+    per-waste-type and per-route sum the model takes is preserved.
+    """
+    agg, preview, rows, pending = None, None, 0, []
+    for chunk in iter_chunks(name, source, chunksize):
+        if preview is None:
+            preview = chunk.head(PREVIEW_ROWS).copy()
+            mapping = suggest_column_mapping(dataset_type, chunk) if mapping is None else mapping
+        rows += len(chunk)
+        part = canonicalize(dataset_type, chunk, mapping, year)
+        for c in part.columns:
+            if pd.api.types.is_datetime64_any_dtype(part[c]):
+                part[c] = part[c].dt.floor("D")
+            elif isinstance(part[c].dtype, pd.CategoricalDtype):
+                part[c] = part[c].astype(object)  # chunk categories differ; recast at the end
+        pending.append(_aggregate(part))
+        if sum(len(p) for p in pending) > chunksize:
+            pending = [_aggregate(pd.concat(pending, ignore_index=True))]
+    if pending:
+        agg = _aggregate(pd.concat(pending, ignore_index=True))
+        for c in agg.columns:
+            if agg[c].dtype == object:
+                agg[c] = agg[c].astype("category")
+    else:
+        agg = pd.DataFrame()
+    return agg, (preview if preview is not None else pd.DataFrame()), rows
+
+def stream_bundle(files, chunksize=STREAM_CHUNK_ROWS, mappings=None) -> dict:
+    """Build a compact bundle from (dataset_type, name, source) triples via stream_table.
+
+    Month names ("Jan") are kept as labels; the model places them in the
+    year of the dated datasets. Raw previews are kept under
+    bundle["preview"] and rows read under bundle["rows_read"].
+    """
+    mappings = dict(mappings or {})
+    bundle = {"preview": {}, "rows_read": {}}
+    for dtype, name, source in files:
+        if mappings.get(dtype) is None:
+            mappings[dtype] = suggest_column_mapping(dtype, read_preview(name, source))
+        agg, preview, rows = stream_table(name, source, dtype, mappings[dtype], chunksize=chunksize)
+        bundle[dtype] = agg
+        bundle["preview"][dtype] = preview
+        bundle["rows_read"][dtype] = rows
+    bundle["column_plan"] = _canonical_plan(bundle, mappings)
+    return bundle
+
+def load_process_map(path) -> dict:
+    """Read a process map JSON: either a list of blocks or an object with
+    "blocks" plus optional site_name, boundary_start, boundary_end, scenarios
+    and columns (per-dataset {role: header} overrides, see COLUMN_KEYWORDS)."""
+    spec = json.loads(Path(path).read_text())
+    if isinstance(spec, list):
+        spec = {"blocks": spec}
+    blocks = []
+    for b in spec.get("blocks", []):
+        if isinstance(b, str):
+            b = {"name": b}
+        b = dict(b)
+        b.setdefault("user_label", b.get("name", ""))
+        b.setdefault("name", b["user_label"])
+        b.setdefault("type", suggest_process_type(b["user_label"]))
+        b.setdefault("yield_pct", 92)
+        blocks.append(b)
+    spec["blocks"] = blocks
+    return spec
+
+class ParsedFileCache:
+    """Process-wide LRU cache of parsed uploads keyed by content hash.
+
+    Entries are evicted least-recently-used first once the summed DataFrame
+    memory exceeds budget_bytes. Returned frames are shared between callers
+    (and Streamlit sessions) and must be treated as read-only.
+    """
+
+    def __init__(self, budget_bytes=512 * 1024 * 1024):
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict()  # key -> (df, nbytes)
+        self._used = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_parse(self, name: str, data: bytes, digest: str | None = None, usecols=None, dtype=None) -> pd.DataFrame:
+        # The parser depends on the extension and the column selection, so both are part of the key
+        key = (name.lower().rsplit(".", 1)[-1], digest or content_hash(data),
+               tuple(usecols) if usecols is not None else None, tuple(sorted((dtype or {}).items())))
+        return self._get(key, lambda: parse_upload(name, data, usecols, dtype))
+
+    def get_sheets(self, name: str, data: bytes, digest: str | None = None) -> dict:
+        # Workbooks are cached as a whole: {sheet title: DataFrame}
+        key = (name.lower().rsplit(".", 1)[-1], digest or content_hash(data), "sheets")
+        return self._get(key, lambda: read_excel_sheets(data))
+
+    def get_preview(self, name: str, data: bytes, digest: str | None = None) -> pd.DataFrame:
+        key = (name.lower().rsplit(".", 1)[-1], digest or content_hash(data), "preview")
+        return self._get(key, lambda: read_preview(name, BytesIO(data)))
+
+    def _get(self, key, parse):
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return hit[0]
+            self.misses += 1
+
+        df = parse()
+        frames = df.values() if isinstance(df, dict) else [df]
+        nbytes = sum(int(f.memory_usage(deep=True).sum()) for f in frames)
+        if nbytes > self.budget_bytes:
+            return df  # larger than the whole budget: hand it back uncached
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (df, nbytes)
+                self._used += nbytes
+                while self._used > self.budget_bytes:
+                    _, (_, freed) = self._entries.popitem(last=False)
+                    self._used -= freed
+            return self._entries[key][0]
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "used_mb": self._used / 1e6,
+                    "budget_mb": self.budget_bytes / 1e6, "hits": self.hits, "misses": self.misses}
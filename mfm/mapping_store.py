@@ -0,0 +1,66 @@
+"""On-disk memory of confirmed dataset types and column mappings.
+
+Entries are keyed by a signature of the normalized header set, so next
+month's export of the same ERP report is recognised whatever its filename,
+column order or header spacing. Each signature is one small JSON file, which
+keeps lookups O(1) and lets concurrent sessions write without a shared lock.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+
+def default_store_dir() -> Path:
+    return Path(os.environ.get("MFM_MAPPING_STORE", Path.home() / ".mfm" / "mappings"))
+
+def normalize_header(header) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", str(header).lower()).strip()
+
+def header_signature(columns) -> str:
+    norm = sorted({normalize_header(c) for c in columns})
+    return hashlib.blake2b("\x1f".join(norm).encode(), digest_size=16).hexdigest()
+
+class MappingStore:
+    """Remembers (dataset_type, column mapping) per header signature under root."""
+
+    def __init__(self, root=None):
+        self.root = Path(root) if root is not None else default_store_dir()
+
+    def _path(self, columns) -> Path:
+        return self.root / f"{header_signature(columns)}.json"
+
+    def lookup(self, columns):
+        """(dataset_type, mapping) confirmed earlier for these headers, else None.
+
+        The stored mapping is translated back to this file's exact headers.
+        """
+        try:
+            entry = json.loads(self._path(columns).read_text())
+        except (OSError, ValueError):
+            return None
+        actual = {normalize_header(c): c for c in columns}
+        mapping = {role: actual.get(h) if h is not None else None for role, h in entry["mapping"].items()}
+        return entry["dataset_type"], mapping
+
+    def remember(self, columns, dataset_type, mapping):
+        path = self._path(columns)
+        entry = {
+            "dataset_type": dataset_type,
+            "mapping": {role: normalize_header(c) if c is not None else None for role, c in mapping.items()},
+            "headers": [str(c) for c in columns],
+        }
+        self.root.mkdir(parents=True, exist_ok=True)
+        # write-then-rename so a reader never sees half a file; the temp name is unique per
+        # call, since sessions are threads of one process and may confirm the same format at once
+        with tempfile.NamedTemporaryFile("w", dir=self.root, prefix=f"{path.stem}.", suffix=".tmp", delete=False) as tmp:
+            tmp.write(json.dumps(entry, indent=1))
+        try:
+            os.replace(tmp.name, path)
+        except OSError:
+            Path(tmp.name).unlink(missing_ok=True)
+            raise
+
+    def forget(self, columns):
+        self._path(columns).unlink(missing_ok=True)
@@ -1,6 +1,12 @@
+import copy
+
 import pandas as pd
 import numpy as np
 
+from .profiling import NULL_PROFILER, StageProfiler
+
+ASSUMED_UNIT_MASS_KG = 15.0  # demo default: pcs → kg conversion for production output
+
 def build_flow_model(site_name, boundary_start, boundary_end, process_blocks, data_bundle, time_period, scenarios):
     return {
         "site_name": site_name,
@@ -19,17 +25,71 @@ def _find_col(df, keywords):
             return c
     return None
 
-def _sum_material_in_kg(material_df):
-    kg_col = _find_col(material_df, ["kg", "weight"])
+_PERIOD_KEYWORDS = ["date", "month", "period", "week"]
+
+# Header keywords per dataset role; role names match suggest_column_mapping and the canonical schema
+COLUMN_KEYWORDS = {
+    "production_output": {"date": _PERIOD_KEYWORDS, "qty": ["qty", "produced", "quantity"], "unit": ["unit"], "product": ["product"]},
+    "material_purchases": {"period": _PERIOD_KEYWORDS, "material": ["material"], "mass_kg": ["kg", "weight"]},
+    "energy_site": {"period": _PERIOD_KEYWORDS, "electricity_kwh": ["electric"], "gas_kwh": ["gas"]},
+    "waste_summary": {"period": _PERIOD_KEYWORDS, "waste_type": ["waste"], "mass_kg": ["kg", "quantity"], "route": ["route", "disposal"]},
+}
+
+def resolve_columns(dataset_type, df, overrides=None):
+    """Map each role of a dataset type to a header of df (None when absent).
+
+    overrides ({role: header or None}) take precedence over keyword detection.
+    """
+    cols = {role: _find_col(df, kw) for role, kw in COLUMN_KEYWORDS.get(dataset_type, {}).items()}
+    if dataset_type == "energy_site" and not cols["electricity_kwh"] and not cols["gas_kwh"]:
+        # a lone unlabelled kWh column is read as site electricity
+        cols["electricity_kwh"] = _find_col(df, ["kwh"])
+    for role, col in (overrides or {}).items():
+        if col is not None and col not in df.columns:
+            raise ValueError(f"Column override '{col}' for {dataset_type}.{role} not found.")
+        cols[role] = col
+    return cols
+
+def column_fallbacks(dataset_type, cols):
+    """{role: header} of the roles in a mapping filled without a matching label.
+
+    Only a lone kWh column qualifies: read as electricity although its header
+    names no carrier. Column plans keep this under "fallback", with the
+    original header, so the flag survives canonicalizing.
+    """
+    if dataset_type != "energy_site":
+        return {}
+    elec = cols.get("electricity_kwh")
+    if elec and not cols.get("gas_kwh") and not any(k in str(elec).lower() for k in COLUMN_KEYWORDS[dataset_type]["electricity_kwh"]):
+        return {"electricity_kwh": elec}
+    return {}
+
+def build_column_plan(data_bundle, overrides=None):
+    overrides = overrides or {}
+    plan = {}
+    for name in COLUMN_KEYWORDS:
+        if data_bundle.get(name) is not None:
+            cols = resolve_columns(name, data_bundle[name], overrides.get(name))
+            plan[name] = {**cols, "fallback": column_fallbacks(name, cols)}
+    return plan
+
+def attach_column_plan(data_bundle, overrides=None):
+    # Resolved once and carried with the bundle like the time index; passing overrides re-resolves
+    if overrides is not None or "column_plan" not in data_bundle:
+        data_bundle["column_plan"] = build_column_plan(data_bundle, overrides)
+    return data_bundle["column_plan"]
+
+def _sum_material_in_kg(material_df, cols):
+    kg_col = cols.get("mass_kg")
     return float(material_df[kg_col].astype(float).sum()) if kg_col else None
 
-def _sum_waste_kg(waste_df):
-    kg_col = _find_col(waste_df, ["kg", "quantity"])
+def _sum_waste_kg(waste_df, cols):
+    kg_col = cols.get("mass_kg")
     return float(waste_df[kg_col].astype(float).sum()) if kg_col else None
 
-def _sum_waste_by_type(waste_df):
-    type_col = _find_col(waste_df, ["waste"])
-    kg_col = _find_col(waste_df, ["kg", "quantity"])
+def _sum_waste_by_type(waste_df, cols):
+    type_col = cols.get("waste_type")
+    kg_col = cols.get("mass_kg")
     if not type_col or not kg_col:
         return pd.DataFrame(columns=["Waste Type", "Quantity (kg)"])
     out = (waste_df[[type_col, kg_col]]
@@ -38,142 +98,231 @@ def _sum_waste_by_type(waste_df):
     out["Quantity (kg)"] = out["Quantity (kg)"].astype(float)
     return out
 
-def _energy_totals(energy_df):
-    elec_col = _find_col(energy_df, ["electric"])
-    gas_col  = _find_col(energy_df, ["gas"])
-    elec = float(energy_df[elec_col].sum()) if elec_col else 0.0
-    gas  = float(energy_df[gas_col].sum())  if gas_col else 0.0
+def _energy_totals(energy_df, cols):
+    elec_col = cols.get("electricity_kwh")
+    gas_col  = cols.get("gas_kwh")
+    elec = float(energy_df[elec_col].astype(float).sum()) if elec_col else 0.0
+    gas  = float(energy_df[gas_col].astype(float).sum())  if gas_col else 0.0
     return elec, gas, bool(elec_col or gas_col)
 
-def compute_balances(model):
+def _diverted_kg(waste_df, cols):
+    # Diversion: count Recycling + Reuse as diverted (based on Disposal Route column if present)
+    route_col = cols.get("route")
+    if not route_col:
+        return 0.0, False
+    kg_col = cols.get("mass_kg")
+    tmp = waste_df.copy()
+    tmp[kg_col] = tmp[kg_col].astype(float)
+    return float(tmp[tmp[route_col].astype(str).str.lower().isin(["recycling", "reuse"])][kg_col].sum()), True
+
+def _opportunities(waste_by_type):
+    # Simple circular opportunities (rule-based, not hype)
+    opportunities = []
+    if not waste_by_type.empty:
+        # steel scrap heuristic
+        steel_row = waste_by_type[waste_by_type["Waste Type"].astype(str).str.lower().str.contains("steel|metal|scrap", regex=True)]
+        if not steel_row.empty and float(steel_row["Quantity (kg)"].sum()) > 500:
+            opportunities.append("High clean metal scrap: consider closed-loop recycling with supplier or local reprocessor.")
+        mixed_row = waste_by_type[waste_by_type["Waste Type"].astype(str).str.lower().str.contains("mixed", regex=True)]
+        if not mixed_row.empty and float(mixed_row["Quantity (kg)"].sum()) > 300:
+            opportunities.append("Mixed waste is significant: segregation could increase recycling rate and reduce disposal cost.")
+        sludge_row = waste_by_type[waste_by_type["Waste Type"].astype(str).str.lower().str.contains("sludge|hazard", regex=True)]
+        if not sludge_row.empty and float(sludge_row["Quantity (kg)"].sum()) > 100:
+            opportunities.append("Hazardous/sludge stream: review upstream process controls and chemical use to reduce generation.")
+    return opportunities
+
+def _loss_split(blocks):
+    # Attribute unaccounted to cutting/forming where possible
+    loss_targets = [b for b in blocks if b.get("type") in ("cutting", "forming")]
+    if not loss_targets:
+        loss_targets = [blocks[0]]
+
+    if len(loss_targets) == 2:
+        split = np.array([0.6, 0.4])
+    else:
+        # one target takes everything; longer chains share losses equally
+        split = np.ones(len(loss_targets)) / len(loss_targets)
+    return [b["user_label"] for b in loss_targets], split
+
+def compute_baseline(model, profiler=None):
+    """Scenario-independent stage of compute_balances.
+
+    Detects columns, sums the datasets and runs the opportunity rules once.
+    The returned dict is cheap to feed into apply_scenario / sweep_scenarios
+    and can be cached for as long as the bundle and process blocks are unchanged.
+    Pass a StageProfiler to record per-stage timings under "perf".
+    """
     data = model["data"]
     blocks = model["blocks"]
-    sc = model["scenarios"]
+    prof = profiler or NULL_PROFILER
+    plan = attach_column_plan(data)
+    prof.lap("column_detection", rows=sum(len(data[name].columns) for name in plan))
 
-    ai_messages = []
     assumptions = []
 
     # ---------- Inputs ----------
-    mat_in = _sum_material_in_kg(data["material_purchases"])
+    mat_in = _sum_material_in_kg(data["material_purchases"], plan["material_purchases"])
     if mat_in is None:
         mat_in = 0.0
         assumptions.append("Material input mass missing; treated as 0 kg.")
 
     waste_df = data["waste_summary"]
-    waste_out = _sum_waste_kg(waste_df)
+    waste_out = _sum_waste_kg(waste_df, plan["waste_summary"])
     if waste_out is None:
         waste_out = 0.0
         assumptions.append("Waste mass missing; treated as 0 kg.")
 
     # Production (pcs → kg via demo assumption)
     prod_df = data["production_output"]
-    qty_col = _find_col(prod_df, ["qty", "produced", "quantity"])
+    qty_col = plan["production_output"]["qty"]
     qty = float(prod_df[qty_col].sum()) if qty_col else 0.0
-    assumed_unit_mass = 15.0  # demo default
+    assumed_unit_mass = ASSUMED_UNIT_MASS_KG
     prod_mass_out_base = qty * assumed_unit_mass
     assumptions.append(f"Converted output to mass using assumed unit mass = {assumed_unit_mass:.1f} kg/pc (demo assumption).")
+    prof.lap("inputs", rows=len(data["material_purchases"]) + len(waste_df) + len(prod_df))
+
+    loss_targets, split = _loss_split(blocks)
+
+    # ---------- Energy ----------
+    elec_kwh, gas_kwh, has_energy = _energy_totals(data["energy_site"], plan["energy_site"])
+    elec_col = plan["energy_site"].get("fallback", {}).get("electricity_kwh")
+    if elec_col:
+        assumptions.append(f"Energy column '{elec_col}' is not labelled by carrier; treated as electricity.")
+
+    # proxy weights: use yields as a stand-in for relative activity; fallback equal weights
+    weights = []
+    for b in blocks:
+        y = float(b.get("yield_pct", 92))
+        weights.append(max(y, 1.0))
+    weights = np.array(weights, dtype=float)
+    weights = weights / weights.sum() if weights.sum() > 0 else np.ones(len(blocks)) / len(blocks)
+    prof.lap("energy_totals", rows=len(data["energy_site"]))
+
+    # ---------- Circularity ----------
+    waste_by_type = _sum_waste_by_type(waste_df, plan["waste_summary"])
+    prof.lap("waste_by_type", rows=len(waste_df))
+    diverted_kg, has_route = _diverted_kg(waste_df, plan["waste_summary"])
+    prof.lap("diversion", rows=len(waste_df))
+
+    opportunities = _opportunities(waste_by_type)
+    prof.lap("opportunities", rows=len(waste_by_type))
+
+    baseline = {
+        "mat_in_kg": mat_in,
+        "waste_out_kg": waste_out,
+        "prod_out_base_kg": prod_mass_out_base,
+        "energy_elec_kwh": elec_kwh,
+        "energy_gas_kwh": gas_kwh,
+        "has_energy": has_energy,
+        "energy_weights": weights,
+        "loss_targets": loss_targets,
+        "loss_split": split,
+        "waste_by_type": waste_by_type,
+        "diverted_kg": diverted_kg,
+        "has_route": has_route,
+        "opportunities": opportunities,
+        "assumptions": assumptions,
+        # own copies: baselines outlive the caller's (mutable) block list and may be shared across sessions
+        "blocks": copy.deepcopy(blocks),
+        "boundary_start": copy.deepcopy(model["boundary_start"]),
+        "boundary_end": copy.deepcopy(model["boundary_end"]),
+    }
+    if profiler is not None:
+        baseline["perf"] = list(profiler.records)
+    return baseline
+
+def apply_scenario(baseline, sc, profiler=None, lattice=None):
+    """Scenario stage of compute_balances: scalar arithmetic on a baseline.
+
+    With a lattice from build_scenario_lattice, scenarios on its grid are read
+    from the precomputed arrays instead of recomputed.
+    """
+    prof = profiler or NULL_PROFILER
+    blocks = baseline["blocks"]
+    mat_in = baseline["mat_in_kg"]
+    waste_out = baseline["waste_out_kg"]
+    elec_kwh = baseline["energy_elec_kwh"]
+    gas_kwh = baseline["energy_gas_kwh"]
+    has_energy = baseline["has_energy"]
+
+    ai_messages = []
+    assumptions = list(baseline["assumptions"])
 
     # ---------- Scenarios ----------
     # 1) Scrap reduction reduces waste_out (recycling/landfill streams) proportionally
+    # 2) Yield improvement increases product output mass (simple proxy)
+    # 3) Energy intensity improvement reduces total energy
     scrap_reduction_pct = sc.get("scrap_reduction_pct", 0.0) / 100.0
-    waste_out_scn = waste_out * (1.0 - scrap_reduction_pct)
+    yield_improve_pct = sc.get("yield_improve_pct", 0.0) / 100.0
+    energy_intensity_improve_pct = sc.get("energy_intensity_improve_pct", 0.0) / 100.0
+
+    point = lattice_lookup(lattice, sc) if lattice is not None else None
+    if point is not None:
+        waste_out_scn = point["waste_out_kg"]
+        prod_mass_out = point["prod_out_kg"]
+        unaccounted = point["unaccounted_kg"]
+        elec_kwh = point["energy_elec_kwh"]
+        gas_kwh = point["energy_gas_kwh"]
+        diverted_kg_scn = point["diverted_kg"]
+        diversion_pct = point["diversion_pct"]
+        material_eff = point["material_eff_pct"]
+        waste_intensity = point["waste_intensity"]
+        energy_intensity = point["energy_intensity_kwh_per_kg"]
+    else:
+        waste_out_scn = waste_out * (1.0 - scrap_reduction_pct)
+        prod_mass_out = baseline["prod_out_base_kg"] * (1.0 + yield_improve_pct)
+        unaccounted = max(mat_in - prod_mass_out - waste_out_scn, 0.0)
+        if has_energy and energy_intensity_improve_pct > 0:
+            elec_kwh *= (1.0 - energy_intensity_improve_pct)
+            gas_kwh  *= (1.0 - energy_intensity_improve_pct)
+        # Apply scrap reduction scenario to diversion and waste totals proportionally
+        diverted_kg_scn = baseline["diverted_kg"] * (1.0 - scrap_reduction_pct)
+        diversion_pct = (diverted_kg_scn / waste_out_scn * 100.0) if waste_out_scn > 0 else 0.0
+        material_eff = (prod_mass_out / mat_in) * 100.0 if mat_in > 0 else 0.0
+        waste_intensity = (waste_out_scn / prod_mass_out) if prod_mass_out > 0 else 0.0
+        energy_intensity = ((elec_kwh + gas_kwh) / prod_mass_out) if prod_mass_out > 0 else 0.0
+
     if scrap_reduction_pct > 0:
         ai_messages.append(f"Scenario applied: scrap/waste reduced by {sc.get('scrap_reduction_pct', 0.0):.0f}%.")
-
-    # 2) Yield improvement increases product output mass (simple proxy)
-    yield_improve_pct = sc.get("yield_improve_pct", 0.0) / 100.0
-    prod_mass_out = prod_mass_out_base * (1.0 + yield_improve_pct)
     if yield_improve_pct > 0:
         ai_messages.append(f"Scenario applied: yield improved by {sc.get('yield_improve_pct', 0.0):.0f}% (proxy increases product output).")
 
-    # 3) Energy intensity improvement reduces total energy
-    energy_intensity_improve_pct = sc.get("energy_intensity_improve_pct", 0.0) / 100.0
-
     # ---------- Unaccounted material ----------
-    unaccounted = max(mat_in - prod_mass_out - waste_out_scn, 0.0)
-
-    # Attribute unaccounted to cutting/forming where possible
-    loss_targets = [b for b in blocks if b.get("type") in ("cutting", "forming")]
-    if not loss_targets:
-        loss_targets = [blocks[0]]
-
-    if len(loss_targets) >= 2:
-        split = np.array([0.6, 0.4])
-        split = split[:len(loss_targets)]
-        split = split / split.sum()
-    else:
-        split = np.array([1.0])
-
-    losses = {loss_targets[i]["user_label"]: unaccounted * float(split[i]) for i in range(len(loss_targets))}
+    split = baseline["loss_split"]
+    losses = {label: unaccounted * float(split[i]) for i, label in enumerate(baseline["loss_targets"])}
 
     if unaccounted > 0:
         ai_messages.append(f"Detected ~{unaccounted:,.0f} kg unaccounted material. Likely process losses (offcuts/rejects). Flagged for review.")
         assumptions.append("Unaccounted material attributed to cutting/forming losses (demo heuristic).")
 
     # ---------- Energy ----------
-    energy_df = data["energy_site"]
-    elec_kwh, gas_kwh, has_energy = _energy_totals(energy_df)
     if has_energy:
         if energy_intensity_improve_pct > 0:
-            elec_kwh *= (1.0 - energy_intensity_improve_pct)
-            gas_kwh  *= (1.0 - energy_intensity_improve_pct)
             ai_messages.append(f"Scenario applied: energy intensity improved by {sc.get('energy_intensity_improve_pct', 0.0):.0f}% (reduces site kWh).")
         assumptions.append("Energy is site-level; allocation to processes is optional and uses a proxy (throughput shares).")
+    prof.lap("scenario_math")
 
     # Optional: allocate energy across processes using throughput proxy weights
     allocate_energy = sc.get("allocate_energy", False)
     energy_alloc = None
     if has_energy and allocate_energy:
-        # proxy weights: use yields as a stand-in for relative activity; fallback equal weights
-        weights = []
-        for b in blocks:
-            y = float(b.get("yield_pct", 92))
-            weights.append(max(y, 1.0))
-        weights = np.array(weights, dtype=float)
-        weights = weights / weights.sum() if weights.sum() > 0 else np.ones(len(blocks)) / len(blocks)
-
+        weights = baseline["energy_weights"]
         energy_alloc = pd.DataFrame({
             "Process": [b["user_label"] for b in blocks],
             "Electricity_kWh": (elec_kwh * weights).round(0).astype(int),
             "Gas_kWh": (gas_kwh * weights).round(0).astype(int),
         })
         ai_messages.append("AI assist: allocated site energy to processes using a simple activity proxy (editable assumption).")
+    prof.lap("energy_allocation", rows=len(blocks) if energy_alloc is not None else 0)
 
     # ---------- Circularity metrics ----------
-    waste_by_type = _sum_waste_by_type(waste_df)
-    # Diversion: count Recycling + Reuse as diverted (based on Disposal Route column if present)
-    route_col = _find_col(waste_df, ["route", "disposal"])
-    diverted_kg = 0.0
-    if route_col:
-        kg_col = _find_col(waste_df, ["kg", "quantity"])
-        tmp = waste_df.copy()
-        tmp[kg_col] = tmp[kg_col].astype(float)
-        diverted_kg = float(tmp[tmp[route_col].astype(str).str.lower().isin(["recycling", "reuse"])][kg_col].sum())
-    else:
+    if not baseline["has_route"]:
         assumptions.append("No disposal route column detected; diversion % may be incomplete.")
 
-    # Apply scrap reduction scenario to diversion and waste totals proportionally
-    diverted_kg_scn = diverted_kg * (1.0 - scrap_reduction_pct)
-    diversion_pct = (diverted_kg_scn / waste_out_scn * 100.0) if waste_out_scn > 0 else 0.0
-
-    # Simple circular opportunities (rule-based, not hype)
-    opportunities = []
-    if not waste_by_type.empty:
-        # steel scrap heuristic
-        steel_row = waste_by_type[waste_by_type["Waste Type"].astype(str).str.lower().str.contains("steel|metal|scrap", regex=True)]
-        if not steel_row.empty and float(steel_row["Quantity (kg)"].sum()) > 500:
-            opportunities.append("High clean metal scrap: consider closed-loop recycling with supplier or local reprocessor.")
-        mixed_row = waste_by_type[waste_by_type["Waste Type"].astype(str).str.lower().str.contains("mixed", regex=True)]
-        if not mixed_row.empty and float(mixed_row["Quantity (kg)"].sum()) > 300:
-            opportunities.append("Mixed waste is significant: segregation could increase recycling rate and reduce disposal cost.")
-        sludge_row = waste_by_type[waste_by_type["Waste Type"].astype(str).str.lower().str.contains("sludge|hazard", regex=True)]
-        if not sludge_row.empty and float(sludge_row["Quantity (kg)"].sum()) > 100:
-            opportunities.append("Hazardous/sludge stream: review upstream process controls and chemical use to reduce generation.")
-
     # ---------- Build flows for Sankey ----------
     rows = []
-    start = model["boundary_start"]
-    end = model["boundary_end"]
+    start = baseline["boundary_start"]
+    end = baseline["boundary_end"]
 
     # Main input
     rows.append({"from": start, "to": blocks[0]["user_label"], "kg": mat_in, "kind": "material_in"})
@@ -191,13 +340,10 @@ def compute_balances(model):
         rows.append({"from": k, "to": "Process losses (unaccounted)", "kg": v, "kind": "loss_inferred"})
 
     flows_table = pd.DataFrame(rows)
+    prof.lap("flows_table", rows=len(rows))
 
     # ---------- KPIs ----------
-    material_eff = (prod_mass_out / mat_in) * 100.0 if mat_in > 0 else 0.0
-    waste_intensity = (waste_out_scn / prod_mass_out) if prod_mass_out > 0 else 0.0
-    energy_intensity = ((elec_kwh + gas_kwh) / prod_mass_out) if prod_mass_out > 0 else 0.0
-
-    return {
+    results = {
         "mat_in_kg": mat_in,
         "prod_out_kg": prod_mass_out,
         "waste_out_kg": waste_out_scn,
@@ -208,10 +354,10 @@ def compute_balances(model):
         "energy_gas_kwh": gas_kwh,
         "energy_intensity_kwh_per_kg": energy_intensity,
         "energy_alloc_table": energy_alloc,
-        "waste_by_type": waste_by_type,
+        "waste_by_type": baseline["waste_by_type"],
         "diversion_pct": diversion_pct,
         "diverted_kg": diverted_kg_scn,
-        "opportunities": opportunities,
+        "opportunities": list(baseline["opportunities"]),
         "ai_messages": ai_messages,
         "assumptions": assumptions,
         "flows_table": flows_table,
@@ -219,6 +365,102 @@ def compute_balances(model):
         "boundary_start": start,
         "boundary_end": end,
     }
+    if profiler is not None:
+        results["perf"] = list(profiler.records)
+    return results
+
+def compute_balances(model, profile=False):
+    # profile=True attaches per-stage wall time / allocations / row counts as results["perf"]
+    if not profile:
+        return apply_scenario(compute_baseline(model), model["scenarios"])
+    prof = StageProfiler()
+    try:
+        return apply_scenario(compute_baseline(model, prof), model["scenarios"], prof)
+    finally:
+        prof.close()
+
+def sweep_scenarios(baseline, scrap_reduction_pct=0.0, yield_improve_pct=0.0, energy_intensity_improve_pct=0.0):
+    """Evaluate KPIs for many scenarios at once on top of compute_baseline output.
+
+    The three percentage arguments accept scalars or arrays and are broadcast
+    together (use np.meshgrid or shaped arrays for a full grid). Every KPI is
+    returned as a NumPy array of the broadcast shape, matching what
+    apply_scenario would return for each individual scenario.
+    """
+    mat_in = baseline["mat_in_kg"]
+    waste_out = baseline["waste_out_kg"]
+    prod_mass_out_base = baseline["prod_out_base_kg"]
+    elec_kwh = baseline["energy_elec_kwh"]
+    gas_kwh = baseline["energy_gas_kwh"]
+    diverted_kg = baseline["diverted_kg"]
+
+    s, y, e = np.broadcast_arrays(
+        np.asarray(scrap_reduction_pct, dtype=float) / 100.0,
+        np.asarray(yield_improve_pct, dtype=float) / 100.0,
+        np.asarray(energy_intensity_improve_pct, dtype=float) / 100.0,
+    )
+
+    waste_out_scn = waste_out * (1.0 - s)
+    prod_mass_out = prod_mass_out_base * (1.0 + y)
+    # compute_balances only applies the energy scenario when it is positive
+    energy_factor = np.where((e > 0) & baseline["has_energy"], 1.0 - e, 1.0)
+    elec_kwh_scn = elec_kwh * energy_factor
+    gas_kwh_scn = gas_kwh * energy_factor
+    energy_kwh = elec_kwh_scn + gas_kwh_scn
+    unaccounted = np.maximum(mat_in - prod_mass_out - waste_out_scn, 0.0)
+    diverted_kg_scn = diverted_kg * (1.0 - s)
+
+    has_prod = prod_mass_out > 0
+    safe_prod = np.where(has_prod, prod_mass_out, 1.0)
+    has_waste = waste_out_scn > 0
+    safe_waste = np.where(has_waste, waste_out_scn, 1.0)
+
+    return {
+        "scrap_reduction_pct": s * 100.0,
+        "yield_improve_pct": y * 100.0,
+        "energy_intensity_improve_pct": e * 100.0,
+        "prod_out_kg": prod_mass_out,
+        "waste_out_kg": waste_out_scn,
+        "unaccounted_kg": unaccounted,
+        "energy_elec_kwh": elec_kwh_scn,
+        "energy_gas_kwh": gas_kwh_scn,
+        "diverted_kg": diverted_kg_scn,
+        "material_eff_pct": (prod_mass_out / mat_in * 100.0) if mat_in > 0 else np.zeros_like(prod_mass_out),
+        "waste_intensity": np.where(has_prod, waste_out_scn / safe_prod, 0.0),
+        "energy_intensity_kwh_per_kg": np.where(has_prod, energy_kwh / safe_prod, 0.0),
+        "diversion_pct": np.where(has_waste, diverted_kg_scn / safe_waste * 100.0, 0.0),
+    }
+
+# Slider domains of the app's scenario controls: (min, max) in whole percent
+SCENARIO_DOMAIN = {
+    "scrap_reduction_pct": (0, 30),
+    "yield_improve_pct": (0, 15),
+    "energy_intensity_improve_pct": (0, 20),
+}
+
+def build_scenario_lattice(baseline, domain=None):
+    """Precompute sweep_scenarios over every integer point of the slider domain.
+
+    The allocation toggle needs no extra axis: it only splits the energy
+    totals already on the lattice using the baseline's process weights.
+    """
+    domain = domain or SCENARIO_DOMAIN
+    axes = {k: np.arange(lo, hi + 1) for k, (lo, hi) in domain.items()}
+    grid = np.meshgrid(*axes.values(), indexing="ij")
+    values = sweep_scenarios(baseline, **dict(zip(axes, grid)))
+    return {"axes": axes, "values": values}
+
+def lattice_lookup(lattice, sc):
+    # Returns the scalar KPIs for sc, or None if sc is not a lattice point
+    idx = []
+    for k, axis in lattice["axes"].items():
+        v = sc.get(k, 0.0)
+        i = int(round(v)) - int(axis[0])
+        if v != round(v) or not 0 <= i < len(axis):
+            return None
+        idx.append(i)
+    idx = tuple(idx)
+    return {k: float(a[idx]) for k, a in lattice["values"].items()}
 
 def build_sankey_inputs(results):
     flows = results["flows_table"].copy()
@@ -228,3 +470,426 @@ def build_sankey_inputs(results):
     targets = [idx[x] for x in flows["to"]]
     values = flows["kg"].astype(float).tolist()
     return {"labels": labels, "sources": sources, "targets": targets, "values": values}
+
+# ---------- Multi-site ----------
+
+def _site_sums(df, col, site_col, mask=None):
+    if col is None:
+        return pd.Series(dtype=float)
+    if site_col not in df.columns:
+        raise ValueError(f"Column '{site_col}' missing from stacked dataset.")
+    vals = pd.to_numeric(df[col], errors="coerce").astype(float)
+    keys = df[site_col]
+    if mask is not None:
+        vals, keys = vals[mask], keys[mask]
+    return vals.groupby(keys, sort=False).sum()
+
+def _site_flows(site_ids, blocks, start, end, mat_in, useful, prod, waste, unaccounted):
+    # One template of (from, to, kind) rows per block configuration; kg is a (sites × rows) matrix
+    labels = [b["user_label"] for b in blocks]
+    loss_targets, split = _loss_split(blocks)
+    frm = [start] + labels[:-1] + [labels[-1], "All processes"] + loss_targets
+    to = [labels[0]] + labels[1:] + [end, "Waste streams"] + ["Process losses (unaccounted)"] * len(loss_targets)
+    kind = (["material_in"] + ["throughput_proxy"] * (len(labels) - 1)
+            + ["product_out", "waste_out"] + ["loss_inferred"] * len(loss_targets))
+    kg = np.column_stack(
+        [mat_in] + [useful] * (len(labels) - 1) + [prod, waste]
+        + [unaccounted * float(f) for f in split]
+    )
+    n_rows = len(frm)
+    return pd.DataFrame({
+        "site_id": np.repeat(np.asarray(site_ids), n_rows),
+        "from": np.tile(np.array(frm, dtype=object), len(site_ids)),
+        "to": np.tile(np.array(to, dtype=object), len(site_ids)),
+        "kg": kg.ravel(),
+        "kind": np.tile(np.array(kind, dtype=object), len(site_ids)),
+    })
+
+def compute_site_balances(data_bundle, process_blocks, scenarios, boundary_start, boundary_end, site_col="site_id"):
+    """Evaluate many sites at once from datasets stacked with a site column.
+
+    process_blocks is either one block list shared by every site or a dict of
+    site id → block list. Returns (kpis, flows): a KPI DataFrame indexed by
+    site and a stacked flows table with a site_id column, with the same
+    arithmetic as compute_balances applied per site.
+    """
+    sc = scenarios
+    mat_df = data_bundle["material_purchases"]
+    waste_df = data_bundle["waste_summary"]
+    prod_df = data_bundle["production_output"]
+    energy_df = data_bundle["energy_site"]
+
+    # Column detection runs once over the stacked frames, not once per site
+    plan = attach_column_plan(data_bundle)
+    waste_kg_col = plan["waste_summary"]["mass_kg"]
+    route_col = plan["waste_summary"]["route"]
+    diverted_mask = None
+    if route_col:
+        diverted_mask = waste_df[route_col].astype(str).str.lower().isin(["recycling", "reuse"])
+
+    sums = {
+        "mat_in": _site_sums(mat_df, plan["material_purchases"]["mass_kg"], site_col),
+        "waste": _site_sums(waste_df, waste_kg_col, site_col),
+        "qty": _site_sums(prod_df, plan["production_output"]["qty"], site_col),
+        "elec": _site_sums(energy_df, plan["energy_site"]["electricity_kwh"], site_col),
+        "gas": _site_sums(energy_df, plan["energy_site"]["gas_kwh"], site_col),
+        "diverted": _site_sums(waste_df, waste_kg_col if route_col else None, site_col, diverted_mask),
+    }
+    site_ids = pd.Index([])
+    for df in (prod_df, mat_df, energy_df, waste_df):
+        if site_col in df.columns:
+            site_ids = site_ids.union(pd.Index(df[site_col].unique()))
+    agg = pd.DataFrame({k: v.reindex(site_ids) for k, v in sums.items()}, index=site_ids).fillna(0.0)
+    agg.index.name = site_col
+
+    scrap = sc.get("scrap_reduction_pct", 0.0) / 100.0
+    yld = sc.get("yield_improve_pct", 0.0) / 100.0
+    energy = sc.get("energy_intensity_improve_pct", 0.0) / 100.0
+    energy_factor = (1.0 - energy) if energy > 0 else 1.0
+
+    mat_in = agg["mat_in"].to_numpy()
+    waste_out = agg["waste"].to_numpy() * (1.0 - scrap)
+    prod_out = agg["qty"].to_numpy() * ASSUMED_UNIT_MASS_KG * (1.0 + yld)
+    elec = agg["elec"].to_numpy() * energy_factor
+    gas = agg["gas"].to_numpy() * energy_factor
+    diverted = agg["diverted"].to_numpy() * (1.0 - scrap)
+    unaccounted = np.maximum(mat_in - prod_out - waste_out, 0.0)
+    useful = np.maximum(mat_in - waste_out - unaccounted, 0.0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kpis = pd.DataFrame({
+            "mat_in_kg": mat_in,
+            "prod_out_kg": prod_out,
+            "waste_out_kg": waste_out,
+            "unaccounted_kg": unaccounted,
+            "material_eff_pct": np.where(mat_in > 0, prod_out / mat_in * 100.0, 0.0),
+            "waste_intensity": np.where(prod_out > 0, waste_out / prod_out, 0.0),
+            "energy_elec_kwh": elec,
+            "energy_gas_kwh": gas,
+            "energy_intensity_kwh_per_kg": np.where(prod_out > 0, (elec + gas) / prod_out, 0.0),
+            "diverted_kg": diverted,
+            "diversion_pct": np.where(waste_out > 0, diverted / waste_out * 100.0, 0.0),
+        }, index=agg.index)
+
+    # Flows: one vectorized build per distinct block configuration
+    if isinstance(process_blocks, dict):
+        missing = [sid for sid in site_ids if sid not in process_blocks]
+        if missing:
+            raise ValueError(f"No process blocks given for site(s): {', '.join(map(str, missing))}.")
+        groups = {}
+        for pos, sid in enumerate(site_ids):
+            blocks = process_blocks[sid]
+            key = tuple(tuple(sorted(b.items())) for b in blocks)
+            groups.setdefault(key, (blocks, []))[1].append(pos)
+        configs = list(groups.values())
+    else:
+        configs = [(process_blocks, list(range(len(site_ids))))]
+
+    parts, order = [], []
+    for blocks, pos in configs:
+        pos = np.asarray(pos, dtype=int)
+        part = _site_flows(site_ids[pos], blocks, boundary_start, boundary_end,
+                           mat_in[pos], useful[pos], prod_out[pos], waste_out[pos], unaccounted[pos])
+        parts.append(part)
+        order.append(np.repeat(pos, len(part) // max(len(pos), 1)))
+    if parts:
+        flows = pd.concat(parts, ignore_index=True)
+        # keep sites in KPI order when several block configurations were built separately
+        flows = flows.iloc[np.argsort(np.concatenate(order), kind="stable")].reset_index(drop=True)
+    else:
+        flows = pd.DataFrame(columns=["site_id", "from", "to", "kg", "kind"])
+    if site_col != "site_id":
+        flows = flows.rename(columns={"site_id": site_col})
+    return kpis, flows
+
+# ---------- Per-period ----------
+
+_MONTHS = {m: i for i, m in enumerate(["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], start=1)}
+_PERIOD_FREQ = {"Month": "M", "Quarter": "Q", "Week": "W"}
+
+def _month_labels(series):
+    # True for year-less month names ("Jan", "February", ...)
+    if pd.api.types.is_datetime64_any_dtype(series) or isinstance(series.dtype, pd.PeriodDtype):
+        return False
+    low = series.astype(str).str.strip().str.lower()
+    return bool(low.str.fullmatch(r"[a-z]{3,9}\.?").all() and low.str[:3].isin(list(_MONTHS)).all())
+
+def _parse_periods(series, year=None):
+    # Returns (period Series, native granularity "M" or "D"); month names become NaT without a year
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.dt.to_period("D"), "D"
+    if isinstance(series.dtype, pd.PeriodDtype):
+        # canonical bundles store month columns as period[M]
+        return (series, "M") if series.dtype == pd.PeriodDtype("M") else (series.dt.asfreq("D"), "D")
+    s = series.astype(str).str.strip()
+    low = s.str.lower()
+    if _month_labels(series):
+        if year is None:
+            return pd.Series(pd.PeriodIndex([pd.NaT] * len(s), freq="M"), index=s.index), "M"
+        months = low.str[:3].map(_MONTHS)
+        return pd.Series(pd.PeriodIndex.from_fields(year=np.full(len(s), year), month=months.to_numpy(), freq="M"), index=s.index), "M"
+    if s.str.fullmatch(r"\d{4}-\d{1,2}").all() or low.str.fullmatch(r"[a-z]{3,9}\.? \d{4}").all():
+        return pd.to_datetime(s, errors="coerce", format="mixed").dt.to_period("M"), "M"
+    return pd.to_datetime(s, errors="coerce", format="mixed").dt.to_period("D"), "D"
+
+def _grouped_by_period(df, value_cols, periods, native, freq):
+    # One grouped pass per dataset; monthly rows are spread pro-rata by day when weeks are requested
+    vals = df[value_cols].apply(pd.to_numeric, errors="coerce").astype(float)
+    if native == "M" and freq == "W":
+        monthly = vals.groupby(periods).sum()
+        days = [pd.period_range(p.start_time, p.end_time, freq="D") for p in monthly.index]
+        per_day = monthly.div([len(d) for d in days], axis=0)
+        expanded = per_day.loc[np.repeat(monthly.index, [len(d) for d in days])]
+        expanded.index = pd.PeriodIndex(np.concatenate([d.asfreq("W") for d in days]), freq="W")
+        return expanded.groupby(level=0).sum()
+    keys = periods.dt.asfreq(freq) if native != freq else periods
+    return vals.groupby(keys).sum()
+
+# Value columns summed per dataset by the period and time-range views
+_DATASET_VALUES = {
+    "production_output": {"qty": "qty"},
+    "material_purchases": {"mat_in": "mass_kg"},
+    "energy_site": {"elec": "electricity_kwh", "gas": "gas_kwh"},
+    "waste_summary": {"waste": "mass_kg"},
+}
+
+def _resolve_period_columns(data):
+    plan = attach_column_plan(data)
+    parsed = {}
+    for name, roles in _DATASET_VALUES.items():
+        if name not in plan:
+            continue
+        cols = plan[name]
+        value_cols = {k: cols[role] for k, role in roles.items() if cols.get(role)}
+        period_col = cols.get("date") or cols.get("period")
+        parsed[name] = (data[name], value_cols, period_col)
+    return parsed
+
+def _reference_year(parsed):
+    # Day-level datasets supply the year for "Jan"-style month labels
+    years = []
+    for df, _, period_col in parsed.values():
+        if period_col:
+            p, native = _parse_periods(df[period_col])
+            if native == "D" and p.notna().any():
+                years.append(int(p.dt.year.mode().iloc[0]))
+    return min(years) if years else None
+
+def _label_year_note(name, period_col, year):
+    # Assumption line for month names whose year was not given explicitly
+    if year is None:
+        return (f"{name}: '{period_col}' holds month names without a year and no dataset has full dates; "
+                "left out of per-period and date-range totals.")
+    return f"{name}: month names in '{period_col}' read as {year}, the year of the dated datasets."
+
+def compute_period_baseline(model, freq=None, year=None):
+    """Scenario-independent per-period totals (Month, Quarter or Week).
+
+    Each dataset is grouped once on its own date/month column and the results
+    are aligned on a common PeriodIndex. Datasets without a period column are
+    spread across periods in proportion to material input. Month names
+    ("Jan") take year, else the year of the day-dated datasets (noted in the
+    assumptions); with neither they are left out.
+    """
+    data = model["data"]
+    freq = freq or _PERIOD_FREQ.get(model.get("time_period"), "M")
+    assumptions = []
+
+    parsed = _resolve_period_columns(data)
+    explicit_year = year is not None
+    year = year if explicit_year else _reference_year(parsed)
+
+    sums = {}
+    undated = {}
+    for name, (df, value_cols, period_col) in parsed.items():
+        if not value_cols:
+            continue
+        if not period_col:
+            undated.update({k: float(pd.to_numeric(df[c], errors="coerce").sum()) for k, c in value_cols.items()})
+            continue
+        if not explicit_year and _month_labels(df[period_col]):
+            assumptions.append(_label_year_note(name, period_col, year))
+            if year is None:
+                continue
+        periods, native = _parse_periods(df[period_col], year)
+        if periods.isna().any():
+            assumptions.append(f"{name}: {int(periods.isna().sum())} rows with unreadable '{period_col}' excluded from period view.")
+        g = _grouped_by_period(df, list(value_cols.values()), periods, native, freq)
+        for k, c in value_cols.items():
+            sums[k] = g[c]
+        if native == "M" and freq == "W":
+            assumptions.append(f"{name}: monthly totals spread evenly across days to estimate weekly values.")
+
+    table = pd.DataFrame(sums).sort_index()
+    for k in ("qty", "mat_in", "elec", "gas", "waste"):
+        if k not in table.columns:
+            table[k] = 0.0
+    table = table.fillna(0.0)
+
+    if undated and not table.empty:
+        share = table["mat_in"] / table["mat_in"].sum() if table["mat_in"].sum() > 0 else pd.Series(1.0 / len(table), index=table.index)
+        for k, total in undated.items():
+            table[k] = total * share
+            assumptions.append(f"No period column for '{k}'; total spread across periods in proportion to material input.")
+
+    return {"totals": table, "assumptions": assumptions, "freq": freq}
+
+def apply_period_scenario(period_baseline, sc):
+    """Per-period balances and KPIs with the same scenario arithmetic as apply_scenario."""
+    table = period_baseline["totals"]
+    scrap = sc.get("scrap_reduction_pct", 0.0) / 100.0
+    yld = sc.get("yield_improve_pct", 0.0) / 100.0
+    energy = sc.get("energy_intensity_improve_pct", 0.0) / 100.0
+    energy_factor = (1.0 - energy) if energy > 0 else 1.0
+
+    mat_in = table["mat_in"]
+    prod_out = table["qty"] * ASSUMED_UNIT_MASS_KG * (1.0 + yld)
+    waste_out = table["waste"] * (1.0 - scrap)
+    elec = table["elec"] * energy_factor
+    gas = table["gas"] * energy_factor
+
+    out = pd.DataFrame({
+        "mat_in_kg": mat_in,
+        "prod_out_kg": prod_out,
+        "waste_out_kg": waste_out,
+        "unaccounted_kg": (mat_in - prod_out - waste_out).clip(lower=0.0),
+        "material_eff_pct": (prod_out / mat_in * 100.0).where(mat_in > 0, 0.0),
+        "waste_intensity": (waste_out / prod_out).where(prod_out > 0, 0.0),
+        "energy_elec_kwh": elec,
+        "energy_gas_kwh": gas,
+        "energy_intensity_kwh_per_kg": ((elec + gas) / prod_out).where(prod_out > 0, 0.0),
+    })
+    out.index.name = "period"
+    return {"period_table": out, "assumptions": list(period_baseline["assumptions"]), "freq": period_baseline["freq"]}
+
+def compute_period_balances(model, freq=None):
+    return apply_period_scenario(compute_period_baseline(model, freq), model["scenarios"])
+
+# ---------- Time-range index ----------
+
+def _to_ns(values):
+    return np.asarray(values, dtype="datetime64[ns]").view("int64")
+
+def build_time_index(data_bundle, year=None):
+    """Time-sorted prefix sums per dataset for O(log n) date-range totals.
+
+    For every dataset with a date/month column this stores each row's time
+    span (one day, or the whole month for month labels), the row positions in
+    time order and, per value, a cumulative sum with a leading zero. Datasets
+    without a period column, or with month names and no year to place them
+    (year, else the dated datasets'), are left out; range_totals falls back
+    to their full totals.
+    """
+    parsed = _resolve_period_columns(data_bundle)
+    explicit_year = year is not None
+    year = year if explicit_year else _reference_year(parsed)
+    index = {}
+    for name, (df, value_cols, period_col) in parsed.items():
+        if not period_col or not value_cols:
+            continue
+        note = None
+        if not explicit_year and _month_labels(df[period_col]):
+            if year is None:
+                continue
+            note = _label_year_note(name, period_col, year)
+        periods, _ = _parse_periods(df[period_col], year)
+        ok = periods.notna().to_numpy()
+        t = _to_ns(periods[ok].dt.start_time)
+        t_end = _to_ns((periods[ok] + 1).dt.start_time)
+        order = np.argsort(t, kind="stable")
+        cols = dict(value_cols)
+        values = {k: pd.to_numeric(df[c], errors="coerce").fillna(0.0).to_numpy(dtype=float) for k, c in cols.items()}
+        if name == "waste_summary" and "waste" in values:
+            route_col = attach_column_plan(data_bundle)[name]["route"]
+            if route_col:
+                diverted = df[route_col].astype(str).str.lower().isin(["recycling", "reuse"]).to_numpy()
+                values["diverted"] = np.where(diverted, values["waste"], 0.0)
+        index[name] = {
+            "t": t[order],
+            "t_end": t_end[order],
+            "rows": np.flatnonzero(ok)[order],
+            "cum": {k: np.concatenate([[0.0], np.cumsum(v[ok][order])]) for k, v in values.items()},
+            "note": note,
+        }
+    return index
+
+def attach_time_index(data_bundle):
+    # Built once and carried with the bundle; safe to call on every rerun
+    if "time_index" not in data_bundle:
+        data_bundle["time_index"] = build_time_index(data_bundle)
+    return data_bundle["time_index"]
+
+def time_index_bounds(time_index):
+    # First and last covered day; a month label covers its whole month
+    spans = [(ix["t"][0], ix["t_end"][-1]) for ix in time_index.values() if len(ix["t"])]
+    if not spans:
+        return None
+    last = pd.Timestamp(max(e for _, e in spans)) - pd.Timedelta(days=1)
+    return pd.Timestamp(min(s for s, _ in spans)), last
+
+def _range_segments(ix, lo_ns, hi_ns):
+    # (first, stop, fraction) runs of sorted rows overlapping [lo, hi). Rows are
+    # days or months, so only the month holding each bound can be cut, and its
+    # rows are counted pro rata by day.
+    t, t_end = ix["t"], ix["t_end"]
+    first = np.searchsorted(t, lo_ns, side="left")
+    stop = np.searchsorted(t_end, hi_ns, side="right")
+    segments = [(first, stop, 1.0)] if stop > first else []
+    cut_lo = (np.searchsorted(t_end, lo_ns, side="right"), first)
+    cut_hi = (np.searchsorted(t_end, hi_ns, side="right"), np.searchsorted(t, hi_ns, side="left"))
+    for a, b in {cut_lo, cut_hi}:
+        if b > a:
+            span = t_end[a] - t[a]
+            segments.append((a, b, (min(t_end[a], hi_ns) - max(t[a], lo_ns)) / span))
+    return segments
+
+def _range_bounds_ns(start, end):
+    # Inclusive days [start, end] as a half-open nanosecond interval
+    lo, hi = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize() + pd.Timedelta(days=1)
+    return _to_ns([lo, hi])
+
+def range_totals(time_index, start, end):
+    # Inclusive [start, end]: a few binary searches and subtractions per value
+    lo_ns, hi_ns = _range_bounds_ns(start, end)
+    out = {}
+    for name, ix in time_index.items():
+        segments = _range_segments(ix, lo_ns, hi_ns)
+        for k, cum in ix["cum"].items():
+            out[k] = float(sum((cum[b] - cum[a]) * f for a, b, f in segments))
+    return out
+
+def baseline_for_range(baseline, time_index, start, end):
+    """Baseline restricted to a date range, ready for apply_scenario.
+
+    Month-labelled rows count pro rata by the days of their month inside the
+    range. The waste breakdown and the opportunities follow the range when
+    the waste data is dated.
+    """
+    totals = range_totals(time_index, start, end)
+    b = dict(baseline)
+    keys = {"mat_in": "mat_in_kg", "waste": "waste_out_kg", "elec": "energy_elec_kwh",
+            "gas": "energy_gas_kwh", "diverted": "diverted_kg"}
+    for k, target in keys.items():
+        if k in totals:
+            b[target] = totals[k]
+    if "qty" in totals:
+        b["prod_out_base_kg"] = totals["qty"] * ASSUMED_UNIT_MASS_KG
+    waste_ix = time_index.get("waste_summary")
+    if waste_ix is not None and not baseline["waste_by_type"].empty:
+        parts = []
+        for a, stop, frac in _range_segments(waste_ix, *_range_bounds_ns(start, end)):
+            part = baseline["waste_by_type"].iloc[waste_ix["rows"][a:stop]].copy()
+            part["Quantity (kg)"] *= frac
+            parts.append(part)
+        by_type = pd.concat(parts) if parts else baseline["waste_by_type"].iloc[:0]
+        b["waste_by_type"] = by_type
+        b["opportunities"] = _opportunities(by_type)
+    undated = [name for name in _DATASET_VALUES if name not in time_index]
+    note = f"Totals limited to {pd.Timestamp(start):%Y-%m-%d} – {pd.Timestamp(end):%Y-%m-%d}; monthly figures prorated by day."
+    if undated:
+        note += f" Undated datasets ({', '.join(undated)}) use full-period totals"
+        if "waste_summary" in undated:
+            note += ", including the waste breakdown and opportunities"
+        note += "."
+    b["assumptions"] = list(baseline["assumptions"]) + [note] + [ix["note"] for ix in time_index.values() if ix.get("note")]
+    return b
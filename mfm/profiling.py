@@ -0,0 +1,78 @@
+import threading
+import time
+import tracemalloc
+
+# tracemalloc is process-wide; profilers in concurrent threads (Streamlit
+# sessions) share one trace, started by the first and stopped by the last.
+_TRACE_LOCK = threading.Lock()
+_trace_users = 0
+_trace_owned = False
+
+def _acquire_trace():
+    global _trace_users, _trace_owned
+    with _TRACE_LOCK:
+        if _trace_users == 0:
+            _trace_owned = not tracemalloc.is_tracing()
+            if _trace_owned:
+                tracemalloc.start()
+        _trace_users += 1
+
+def _release_trace():
+    global _trace_users, _trace_owned
+    with _TRACE_LOCK:
+        _trace_users -= 1
+        if _trace_users == 0 and _trace_owned:
+            tracemalloc.stop()
+            _trace_owned = False
+
+class StageProfiler:
+    """Lap timer for model stages.
+
+    Each lap() records wall time, net traced allocation and peak traced
+    memory since the previous lap. Starts tracemalloc if it is not already
+    running and stops it again when the last open profiler is closed.
+    Memory figures cover the whole process, so pass trace_memory=False where
+    other threads allocate concurrently (e.g. inside the Streamlit server).
+    """
+
+    def __init__(self, trace_memory=True):
+        self.records = []
+        self.trace_memory = trace_memory
+        self._tracing = False
+        if trace_memory:
+            _acquire_trace()
+            self._tracing = True
+        self._restart()
+
+    def _restart(self):
+        if self.trace_memory:
+            self._mem0 = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self._t0 = time.perf_counter()
+
+    def lap(self, stage, rows=None):
+        rec = {"stage": stage, "wall_ms": (time.perf_counter() - self._t0) * 1000.0, "rows": rows}
+        if self.trace_memory:
+            cur, peak = tracemalloc.get_traced_memory()
+            rec["alloc_kb"] = (cur - self._mem0) / 1024.0
+            rec["peak_kb"] = (peak - self._mem0) / 1024.0
+        self.records.append(rec)
+        self._restart()
+
+    def close(self):
+        if self._tracing:
+            _release_trace()
+            self._tracing = False
+        return self.records
+
+class _NullProfiler:
+    # Stand-in used when profiling is off: lap() is a bare no-op call
+    records = ()
+
+    def lap(self, stage, rows=None):
+        pass
+
+    def close(self):
+        return []
+
+NULL_PROFILER = _NullProfiler()
@@ -0,0 +1,119 @@
+import asyncio
+import atexit
+import threading
+
+class FigureRenderer:
+    """Long-lived kaleido browser shared by every image export in the process.
+
+    Chromium is started once with `workers` tabs on a background event loop;
+    render()/render_many() submit figures to it from any thread, and up to
+    `workers` figures are rasterised concurrently.
+    """
+
+    def __init__(self, workers=2, timeout=90):
+        import kaleido
+
+        self.workers = workers
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="mfm-kaleido", daemon=True)
+        self._thread.start()
+        try:
+            self._kaleido = self._call(self._open(kaleido, workers, timeout)).result()
+        except BaseException:
+            self._stop_loop()
+            raise
+
+    @staticmethod
+    async def _open(kaleido, workers, timeout):
+        k = kaleido.Kaleido(n=workers, timeout=timeout)
+        await k.open()
+        return k
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def _stop_loop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def submit(self, fig, width=1200, height=650, scale=2):
+        # Returns a concurrent.futures.Future resolving to PNG bytes
+        opts = {"format": "png", "width": width, "height": height, "scale": scale}
+        return self._call(self._kaleido.calc_fig(fig, opts))
+
+    def render(self, fig, **opts):
+        return self.submit(fig, **opts).result()
+
+    def render_many(self, figs, **opts):
+        # Failed figures come back as the exception instead of bytes
+        futures = [self.submit(f, **opts) for f in figs]
+        out = []
+        for fut in futures:
+            try:
+                out.append(fut.result())
+            except Exception as e:
+                out.append(e)
+        return out
+
+    def close(self):
+        try:
+            self._call(self._kaleido.close()).result(timeout=30)
+        finally:
+            self._stop_loop()
+
+_renderer = None
+_renderer_error = None
+_lock = threading.Lock()
+
+def get_renderer(workers=2):
+    """Process-wide FigureRenderer, started on first use.
+
+    Returns None when the installed kaleido predates the Kaleido class
+    (0.2.x already keeps its own persistent process behind fig.to_image).
+    A failed start is remembered so later reports don't pay for it again.
+    """
+    global _renderer, _renderer_error
+    with _lock:
+        if _renderer is not None:
+            return _renderer
+        if _renderer_error is not None:
+            raise _renderer_error
+        try:
+            import kaleido
+        except ImportError:
+            return None
+        if not hasattr(kaleido, "Kaleido"):
+            return None
+        try:
+            _renderer = FigureRenderer(workers=workers)
+        except Exception as e:
+            _renderer_error = e
+            raise
+        atexit.register(shutdown_renderer)
+        return _renderer
+
+def shutdown_renderer():
+    global _renderer, _renderer_error
+    with _lock:
+        r, _renderer, _renderer_error = _renderer, None, None
+    if r is not None:
+        r.close()
+
+def render_png(fig, width=1200, height=650, scale=2):
+    r = get_renderer()
+    if r is None:
+        return fig.to_image(format="png", width=width, height=height, scale=scale)
+    return r.render(fig, width=width, height=height, scale=scale)
+
+def render_many_png(figs, width=1200, height=650, scale=2, workers=2):
+    r = get_renderer(workers)
+    if r is None:
+        out = []
+        for f in figs:
+            try:
+                out.append(f.to_image(format="png", width=width, height=height, scale=scale))
+            except Exception as e:
+                out.append(e)
+        return out
+    return r.render_many(figs, width=width, height=height, scale=scale)
@@ -1,15 +1,138 @@
+import hashlib
 from io import BytesIO
 from datetime import datetime
 import pandas as pd
 
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
+# reportlab is imported inside the drawing functions so report_cache_key (called on every
+# Insights rerun) and the headless CLI don't pay for it until a PDF is actually built
+
+from .model import build_sankey_inputs
+from .render import render_png
 
 def _safe_text(s: str) -> str:
     return (s or "").replace("\n", " ").strip()
 
-def build_pdf_report(site_name: str, boundary_start: str, boundary_end: str, results: dict, sankey_fig=None) -> bytes:
+_LINK_COLORS = {
+    "material_in": "#3b82f6",
+    "throughput_proxy": "#64748b",
+    "product_out": "#16a34a",
+    "waste_out": "#f59e0b",
+    "loss_inferred": "#ef4444",
+}
+
+def _sankey_layout(sankey, width, height, node_w=8, pad=10):
+    # Columns by longest path from sources; sinks are pushed to the last column (like plotly's "justify")
+    n = len(sankey["labels"])
+    links = [(s, t, float(v)) for s, t, v in zip(sankey["sources"], sankey["targets"], sankey["values"])]
+    depth = [0] * n
+    for _ in range(n):
+        changed = False
+        for s, t, _v in links:
+            if depth[t] < depth[s] + 1:
+                depth[t] = depth[s] + 1
+                changed = True
+        if not changed:
+            break
+    has_out = {s for s, _t, _v in links}
+    max_depth = max(depth) if depth else 0
+    depth = [d if i in has_out else max_depth for i, d in enumerate(depth)]
+
+    val_in = [0.0] * n
+    val_out = [0.0] * n
+    for s, t, v in links:
+        val_out[s] += v
+        val_in[t] += v
+    value = [max(a, b) for a, b in zip(val_in, val_out)]
+
+    columns = {}
+    for i in range(n):
+        columns.setdefault(depth[i], []).append(i)
+    k = min(
+        (height - pad * (len(col) - 1)) / max(sum(value[i] for i in col), 1e-9)
+        for col in columns.values()
+    )
+    col_gap = (width - node_w) / max(max_depth, 1)
+
+    nodes = [None] * n
+    for d, col in columns.items():
+        y = 0.0
+        for i in col:
+            nh = max(value[i] * k, 1.0)
+            nodes[i] = {"x": d * col_gap, "y": y, "h": nh, "col": d}
+            y += nh + pad
+    return nodes, links, k, col_gap
+
+def _draw_sankey(c, results, x, y_top, width, height):
+    """Draw the flows table as a vector Sankey with its top-left corner at (x, y_top)."""
+    from reportlab.lib.colors import HexColor
+
+    sankey = build_sankey_inputs(results)
+    kinds = results["flows_table"]["kind"].tolist()
+    node_w = 8
+    label_w = 90  # right margin so last-column labels don't collide with the nodes feeding them
+    nodes, links, k, col_gap = _sankey_layout(sankey, width - label_w, height, node_w=node_w)
+    show_labels = col_gap >= 40
+    if not show_labels:
+        nodes, links, k, col_gap = _sankey_layout(sankey, width, height, node_w=node_w)
+
+    # Bands: stack outgoing flows down the source's right edge and incoming down the target's left edge
+    out_off = [0.0] * len(nodes)
+    in_off = [0.0] * len(nodes)
+    c.saveState()
+    c.setFillAlpha(0.35)
+    for (s, t, v), kind in zip(links, kinds):
+        th = v * k
+        if th <= 0:
+            continue
+        ns, nt = nodes[s], nodes[t]
+        x0 = x + ns["x"] + node_w
+        x1 = x + nt["x"]
+        y0 = y_top - ns["y"] - out_off[s]
+        y1 = y_top - nt["y"] - in_off[t]
+        out_off[s] += th
+        in_off[t] += th
+        xm = (x0 + x1) / 2.0
+        c.setFillColor(HexColor(_LINK_COLORS.get(kind, "#94a3b8")))
+        p = c.beginPath()
+        p.moveTo(x0, y0)
+        p.curveTo(xm, y0, xm, y1, x1, y1)
+        p.lineTo(x1, y1 - th)
+        p.curveTo(xm, y1 - th, xm, y0 - th, x0, y0 - th)
+        p.close()
+        c.drawPath(p, stroke=0, fill=1)
+    c.restoreState()
+
+    c.setFillColor(HexColor("#0b1220"))
+    c.setFont("Helvetica", 7)
+    for nd, label in zip(nodes, sankey["labels"]):
+        c.rect(x + nd["x"], y_top - nd["y"] - nd["h"], node_w, nd["h"], stroke=0, fill=1)
+        if show_labels:
+            ly = y_top - nd["y"] - nd["h"] / 2.0 - 2
+            c.drawString(x + nd["x"] + node_w + 3, ly, _safe_text(str(label))[:24])
+
+def report_cache_key(site_name: str, boundary_start: str, boundary_end: str, results: dict) -> str:
+    # Stable digest of everything the PDF shows; profiling output is excluded because it changes every run
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((site_name, boundary_start, boundary_end)).encode())
+    for k in sorted(results):
+        if k == "perf":
+            continue
+        v = results[k]
+        h.update(k.encode())
+        if isinstance(v, pd.DataFrame):
+            h.update(repr(list(v.columns)).encode())
+            h.update(pd.util.hash_pandas_object(v, index=True).to_numpy().tobytes())
+        else:
+            h.update(repr(v).encode())
+    return h.hexdigest()
+
+def build_pdf_report(site_name: str, boundary_start: str, boundary_end: str, results: dict, sankey_fig=None,
+                     sankey_png: bytes | None = None, sankey_mode: str = "vector") -> bytes:
+    # sankey_mode="vector" draws the map natively from results; "image" embeds sankey_png or a kaleido render of sankey_fig
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.utils import ImageReader
+
     buf = BytesIO()
     c = canvas.Canvas(buf, pagesize=A4)
     w, h = A4
@@ -51,10 +174,21 @@ def build_pdf_report(site_name: str, boundary_start: str, boundary_end: str, res
             y = h - 50
             c.setFont("Helvetica", 11)
 
-    # Sankey image (optional)
-    if sankey_fig is not None:
+    if sankey_mode == "vector" and results.get("flows_table") is not None and not results["flows_table"].empty:
+        c.setFont("Helvetica-Bold", 12)
+        c.drawString(40, y, "Material Flow Map")
+        y -= 16
+        map_h = (w - 80) * 0.5
+        if y - map_h < 60:
+            c.showPage()
+            y = h - 50
+        _draw_sankey(c, results, 40, y, w - 80, map_h)
+        y -= (map_h + 18)
+
+    # Sankey image (optional); pass sankey_png when it was already rendered, e.g. by render_many_png
+    elif sankey_fig is not None or sankey_png is not None:
         try:
-            img_bytes = sankey_fig.to_image(format="png", width=1200, height=650, scale=2)
+            img_bytes = sankey_png if sankey_png is not None else render_png(sankey_fig)
             img = ImageReader(BytesIO(img_bytes))
             c.setFont("Helvetica-Bold", 12)
             c.drawString(40, y, "Material Flow Map")
@@ -1,5 +1,8 @@
+import numpy as np
 import pandas as pd
 
+from .model import ASSUMED_UNIT_MASS_KG
+
 def make_synthetic_bundle():
     production_output = pd.DataFrame({
         "Date": ["2025-01-03","2025-01-10","2025-01-17","2025-01-24","2025-02-07","2025-02-14","2025-02-21","2025-03-07","2025-03-14","2025-03-21"],
@@ -32,3 +35,124 @@ def make_synthetic_bundle():
         "energy_site": energy_site,
         "waste_summary": waste_summary,
     }
+
+_WASTE_TYPES = [
+    ("Steel scrap", "Recycling"), ("Mixed waste", "Landfill"), ("Sludge", "Hazardous"),
+    ("Aluminium swarf", "Recycling"), ("Cardboard", "Recycling"), ("Plastic film", "Recycling"),
+    ("Wood pallets", "Reuse"), ("Oily rags", "Hazardous"), ("Spent coolant", "Hazardous"),
+    ("Paint waste", "Hazardous"), ("General waste", "Landfill"), ("Metal offcuts", "Recycling"),
+]
+_MATERIALS = [
+    "Mild steel sheet 2mm", "Mild steel sheet 3mm", "Stainless sheet 1.5mm", "Aluminium sheet 2mm",
+    "Galvanised coil 1mm", "Steel tube 40x40", "Steel bar 20mm", "Powder coat (kg)",
+]
+
+def _cycle_names(base, n):
+    # Base names first, then numbered variants so any count stays readable
+    return [base[i] if i < len(base) else f"{base[i % len(base)]} #{i // len(base) + 1}" for i in range(n)]
+
+def make_large_synthetic_bundle(n_production_rows=1_000_000, n_sites=1, n_products=5, n_materials=3,
+                                n_waste_types=8, days=365, energy_interval_min=15, start="2025-01-01",
+                                raw_dates=False, seed=0):
+    """Seeded, vectorized bundle generator for load testing and benchmarks.
+
+    Produces the same four datasets (and header names) as make_synthetic_bundle
+    at arbitrary scale: production batches spread over `days`, material
+    purchases and waste pickups sized so each site roughly balances, and site
+    energy at `energy_interval_min` resolution with a shift profile. Every
+    dataset gets a `site_id` column when n_sites > 1. With raw_dates=True the
+    date columns are ISO strings, as they would arrive from a CSV upload.
+    """
+    rng = np.random.default_rng(seed)
+    t0 = np.datetime64(pd.Timestamp(start).date(), "s")
+    site_names = np.array([f"SITE-{i+1:04d}" for i in range(n_sites)], dtype=object)
+    site_scale = rng.uniform(0.5, 1.5, n_sites)
+
+    def _dates(seconds):
+        d = t0 + seconds.astype("timedelta64[s]")
+        return np.datetime_as_string(d, unit="s") if raw_dates else d
+
+    # ---------- Production ----------
+    prod_site = rng.integers(0, n_sites, n_production_rows)
+    prod_secs = np.sort(rng.integers(0, days * 86400, n_production_rows))
+    products = np.array([f"ENC-{chr(65 + i % 26)}{i // 26 or ''}" for i in range(n_products)], dtype=object)
+    qty = np.maximum(rng.normal(50, 12, n_production_rows) * site_scale[prod_site], 1).round().astype(np.int64)
+    production_output = pd.DataFrame({
+        "Date": _dates(prod_secs),
+        "Product Code": products[rng.integers(0, n_products, n_production_rows)],
+        "Qty Produced": qty,
+        "Unit": np.full(n_production_rows, "pcs", dtype=object),
+    })
+
+    # Per-site mass targets so material in ≈ product / yield and waste is a share of input
+    prod_kg = np.bincount(prod_site, weights=qty, minlength=n_sites) * ASSUMED_UNIT_MASS_KG
+    site_yield = rng.uniform(0.80, 0.92, n_sites)
+    mat_kg = prod_kg / site_yield
+    waste_kg = (mat_kg - prod_kg) * rng.uniform(0.4, 0.8, n_sites)  # rest is unaccounted loss
+    elec_kwh = prod_kg * rng.uniform(0.6, 1.4, n_sites)
+    gas_kwh = prod_kg * rng.uniform(0.3, 0.8, n_sites)
+
+    # ---------- Material purchases (roughly weekly deliveries per material) ----------
+    # One delivery per site, material and week on a random day of that week, so every
+    # site is supplied across the whole period; rows are then ordered by date.
+    n_weeks = max(days // 7, 1)
+    m_site = np.repeat(np.arange(n_sites), n_materials * n_weeks)
+    m_mat = np.tile(np.repeat(np.arange(n_materials), n_weeks), n_sites)
+    m_week = np.tile(np.arange(n_weeks), n_sites * n_materials)
+    m_secs = m_week * 7 * 86400 + rng.integers(0, min(days, 7) * 86400, len(m_site))
+    order = np.argsort(m_secs, kind="stable")
+    mat_site, m_mat, m_secs = m_site[order], m_mat[order], m_secs[order]
+    mat_w = rng.gamma(4.0, 1.0, len(mat_site))
+    mat_w *= (mat_kg / np.maximum(np.bincount(mat_site, weights=mat_w, minlength=n_sites), 1e-9))[mat_site]
+    material_names = np.array(_cycle_names(_MATERIALS, n_materials), dtype=object)
+    material_purchases = pd.DataFrame({
+        "Date": _dates(m_secs),
+        "Material Description": material_names[m_mat],
+        "Weight (kg)": mat_w.round(1),
+    })
+
+    # ---------- Energy (interval meter data with a two-shift weekday profile) ----------
+    steps_per_day = 24 * 60 // energy_interval_min
+    n_steps = days * steps_per_day
+    step_secs = np.arange(n_steps, dtype=np.int64) * energy_interval_min * 60
+    hour = (step_secs % 86400) / 3600.0
+    weekday = ((step_secs // 86400) + pd.Timestamp(start).dayofweek) % 7 < 5
+    on_shift = weekday & (hour >= 6) & (hour < 22)
+    elec_profile = np.where(on_shift, 180.0, 35.0)
+    gas_profile = (60.0 + 40.0 * np.cos(2 * np.pi * step_secs / (365 * 86400.0))) * np.where(on_shift, 1.6, 0.6)
+    e_site = np.repeat(np.arange(n_sites), n_steps)
+    noise = rng.normal(1.0, 0.08, n_steps * n_sites).clip(0.5, 1.5)
+    energy_site = pd.DataFrame({
+        "Date": _dates(np.tile(step_secs, n_sites)),
+        "Electricity_kWh": (np.tile(elec_profile / elec_profile.sum(), n_sites) * elec_kwh[e_site] * noise).round(2),
+        "Gas_kWh": (np.tile(gas_profile / gas_profile.sum(), n_sites) * gas_kwh[e_site] * noise[::-1]).round(2),
+    })
+
+    # ---------- Waste (weekly pickups per waste type) ----------
+    types = [_WASTE_TYPES[i % len(_WASTE_TYPES)] for i in range(n_waste_types)]
+    type_names = np.array(_cycle_names([t for t, _ in _WASTE_TYPES], n_waste_types), dtype=object)
+    type_routes = np.array([r for _, r in types], dtype=object)
+    type_share = rng.dirichlet(np.full(n_waste_types, 2.0))
+    w_site = np.repeat(np.arange(n_sites), n_waste_types * n_weeks)
+    w_type = np.tile(np.repeat(np.arange(n_waste_types), n_weeks), n_sites)
+    w_week = np.tile(np.arange(n_weeks), n_sites * n_waste_types)
+    w_kg = waste_kg[w_site] * type_share[w_type] / n_weeks * rng.uniform(0.7, 1.3, len(w_site))
+    waste_summary = pd.DataFrame({
+        "Date": _dates(w_week * 7 * 86400),
+        "Waste Type": type_names[w_type],
+        "Quantity (kg)": w_kg.round(1),
+        "Disposal Route": type_routes[w_type],
+    })
+
+    bundle = {
+        "production_output": production_output,
+        "material_purchases": material_purchases,
+        "energy_site": energy_site,
+        "waste_summary": waste_summary,
+    }
+    if n_sites > 1:
+        bundle["production_output"]["site_id"] = site_names[prod_site]
+        bundle["material_purchases"]["site_id"] = site_names[mat_site]
+        bundle["energy_site"]["site_id"] = site_names[e_site]
+        bundle["waste_summary"]["site_id"] = site_names[w_site]
+    return bundle
@@ -0,0 +1,61 @@
+"""Shared fixtures: a four-block process map and small hand-made bundles."""
+import copy
+
+import pandas as pd
+import pytest
+
+BLOCKS = [
+    {"name": "Laser cutting", "user_label": "Laser cutting", "type": "cutting", "yield_pct": 92},
+    {"name": "Press brake", "user_label": "Press brake", "type": "forming", "yield_pct": 95},
+    {"name": "Welding", "user_label": "Welding", "type": "joining", "yield_pct": 98},
+    {"name": "Powder coating", "user_label": "Powder coating", "type": "finishing", "yield_pct": 90},
+]
+
+def _demo_bundle(qty_divisor=1):
+    # The app's demo data; qty_divisor shrinks output so some material goes unaccounted
+    return {
+        "production_output": pd.DataFrame({
+            "Date": ["2025-01-03","2025-01-10","2025-01-17","2025-01-24","2025-02-07","2025-02-14","2025-02-21","2025-03-07","2025-03-14","2025-03-21"],
+            "Product Code": ["ENC-A"]*10,
+            "Qty Produced": [q // qty_divisor for q in [480,510,495,470,520,505,490,515,500,510]],
+            "Unit": ["pcs"]*10,
+        }),
+        "material_purchases": pd.DataFrame({
+            "Month": ["Jan","Feb","Mar"],
+            "Material Description": ["Mild steel sheet 2mm"]*3,
+            "Weight (kg)": [12000,11500,12300],
+        }),
+        "energy_site": pd.DataFrame({
+            "Month": ["Jan","Feb","Mar"],
+            "Electricity_kWh": [38000,36500,39200],
+            "Gas_kWh": [21000,19800,22100],
+        }),
+        "waste_summary": pd.DataFrame({
+            "Waste Type": ["Steel scrap","Mixed waste","Sludge"],
+            "Quantity (kg)": [3200,850,420],
+            "Disposal Route": ["Recycling","Landfill","Hazardous"],
+        }),
+    }
+
+@pytest.fixture
+def blocks():
+    return copy.deepcopy(BLOCKS)
+
+@pytest.fixture
+def make_bundle():
+    return _demo_bundle
+
+@pytest.fixture
+def dated_bundle():
+    # Every dataset dated; month labels take their year from the production dates
+    return {
+        "production_output": pd.DataFrame({"Date": ["2025-01-03", "2025-01-20", "2025-02-07"], "Qty Produced": [100, 100, 100]}),
+        "material_purchases": pd.DataFrame({"Month": ["Jan", "Feb"], "Weight (kg)": [3100.0, 2800.0]}),
+        "energy_site": pd.DataFrame({"Month": ["Jan", "Feb"], "Electricity_kWh": [310.0, 280.0]}),
+        "waste_summary": pd.DataFrame({
+            "Month": ["Jan", "Jan", "Feb"],
+            "Waste Type": ["Steel scrap", "Mixed waste", "Steel scrap"],
+            "Quantity (kg)": [620.0, 310.0, 280.0],
+            "Disposal Route": ["Recycling", "Landfill", "Recycling"],
+        }),
+    }
@@ -0,0 +1,68 @@
+"""Canonical compact schema: dtypes, and the model gives the same answers on it."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from mfm.ingest import canonicalize, canonicalize_bundle, stream_bundle
+from mfm.model import build_flow_model, compute_balances
+
+KPIS = ["mat_in_kg", "prod_out_kg", "waste_out_kg", "unaccounted_kg", "material_eff_pct", "waste_intensity",
+        "energy_elec_kwh", "energy_gas_kwh", "energy_intensity_kwh_per_kg", "diversion_pct", "diverted_kg"]
+
+def test_canonical_dtypes(make_bundle):
+    c = canonicalize_bundle(make_bundle())
+    prod, mat, energy, waste = (c[n] for n in ["production_output", "material_purchases", "energy_site", "waste_summary"])
+    assert list(prod.columns) == ["date", "qty", "unit", "product"]
+    assert pd.api.types.is_datetime64_any_dtype(prod["date"])
+    assert prod["qty"].dtype == np.int32
+    assert isinstance(prod["unit"].dtype, pd.CategoricalDtype)
+    assert mat["mass_kg"].dtype == np.float32 and isinstance(mat["material"].dtype, pd.CategoricalDtype)
+    assert list(energy.columns) == ["period", "electricity_kwh", "gas_kwh"]
+    assert energy["gas_kwh"].dtype == np.float32
+    assert list(waste.columns) == ["waste_type", "mass_kg", "route"]
+    assert c["column_plan"]["waste_summary"]["route"] == "route"
+
+def test_month_names_become_periods_with_a_year(make_bundle):
+    df = canonicalize("material_purchases", make_bundle()["material_purchases"], year=2025)
+    assert df["period"].dtype == pd.PeriodDtype("M")
+    assert df["period"].astype(str).tolist() == ["2025-01", "2025-02", "2025-03"]
+
+def test_fractional_counts_stay_float_and_site_id_passes_through():
+    df = pd.DataFrame({"Date": ["2025-01-01", "2025-01-02"], "Qty Produced": [1.5, 2.0], "Notes": ["a", "b"],
+                       "site_id": ["S1", "S2"]})
+    out = canonicalize("production_output", df)
+    assert out["qty"].dtype == np.float32
+    assert "Notes" not in out.columns
+    assert isinstance(out["site_id"].dtype, pd.CategoricalDtype)
+
+def test_one_source_column_fills_one_role():
+    df = pd.DataFrame({"Month": ["Jan"], "Consumption (kWh)": [10.0]})
+    out = canonicalize("energy_site", df, {"period": "Month", "electricity_kwh": "Consumption (kWh)",
+                                           "gas_kwh": "Consumption (kWh)"})
+    assert list(out.columns) == ["period", "electricity_kwh"]
+
+def test_lone_kwh_fallback_is_flagged_after_canonicalizing(blocks, make_bundle):
+    bundle = make_bundle()
+    bundle["energy_site"] = pd.DataFrame({"Month": ["Jan", "Feb", "Mar"], "Consumption (kWh)": [1000.0] * 3})
+    note = "Energy column 'Consumption (kWh)' is not labelled by carrier; treated as electricity."
+    streamed = stream_bundle([(name, name, df) for name, df in bundle.items()], chunksize=2)
+    for data in (bundle, canonicalize_bundle(bundle), streamed):
+        res = compute_balances(build_flow_model("S", "In", "Out", blocks, data, "Month", {}))
+        assert res["energy_elec_kwh"] == pytest.approx(3000.0)
+        assert note in res["assumptions"]
+    labelled = compute_balances(build_flow_model("S", "In", "Out", blocks, canonicalize_bundle(make_bundle()), "Month", {}))
+    assert not any("not labelled" in a for a in labelled["assumptions"])
+
+@pytest.mark.parametrize("qty_divisor", [1, 3])
+@pytest.mark.parametrize("sc", [{}, {"scrap_reduction_pct": 10.0, "yield_improve_pct": 4.0,
+                                     "energy_intensity_improve_pct": 6.0, "allocate_energy": True}])
+def test_model_equivalent_on_canonical_bundle(blocks, make_bundle, qty_divisor, sc):
+    raw = compute_balances(build_flow_model("S", "In", "Out", blocks, make_bundle(qty_divisor), "Month", dict(sc)))
+    canon = compute_balances(build_flow_model("S", "In", "Out", blocks,
+                                              canonicalize_bundle(make_bundle(qty_divisor)), "Month", dict(sc)))
+    for key in KPIS:
+        assert canon[key] == pytest.approx(raw[key], rel=1e-6), key
+    assert canon["flows_table"]["kg"].tolist() == pytest.approx(raw["flows_table"]["kg"].tolist(), rel=1e-6)
+    assert canon["opportunities"] == raw["opportunities"]
+    if sc.get("allocate_energy"):
+        assert canon["energy_alloc_table"].equals(raw["energy_alloc_table"])
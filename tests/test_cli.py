@@ -0,0 +1,40 @@
+"""python -m mfm on a multi-sheet workbook, with and without --sheet-workers."""
+import json
+
+import pandas as pd
+import pytest
+
+import mfm.ingest
+from mfm.__main__ import main
+
+@pytest.fixture
+def workbook(tmp_path, make_bundle, blocks):
+    # One sheet per dataset, titled after its type, plus an empty sheet that is skipped
+    path = tmp_path / "site.xlsx"
+    with pd.ExcelWriter(path) as w:
+        for name, df in make_bundle().items():
+            df.to_excel(w, sheet_name=name, index=False)
+        pd.DataFrame().to_excel(w, sheet_name="Notes")
+    (tmp_path / "map.json").write_text(json.dumps({"blocks": blocks}))
+    return tmp_path
+
+@pytest.fixture
+def workers_seen(monkeypatch):
+    seen, read = [], mfm.ingest.read_excel_sheets
+    def spy(source, max_workers=None):
+        seen.append(max_workers)
+        return read(source, max_workers)
+    monkeypatch.setattr(mfm.ingest, "read_excel_sheets", spy)
+    return seen
+
+def run(workbook, *extra):
+    out = workbook / f"out{len(extra)}.json"
+    assert main([str(workbook / "site.xlsx"), "--process-map", str(workbook / "map.json"), "--json", str(out), *extra]) == 0
+    return json.loads(out.read_text())
+
+def test_sheet_workers_read_the_same_bundle(workbook, workers_seen):
+    serial = run(workbook)
+    pooled = run(workbook, "--sheet-workers", "2")
+    assert workers_seen == [None, 2]
+    assert serial["mat_in_kg"] == 35800 and serial["energy_gas_kwh"] == 62900
+    assert pooled == serial
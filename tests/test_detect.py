@@ -0,0 +1,38 @@
+"""detect_dataset_type: type, confidence and evidence scores on the demo datasets."""
+import pandas as pd
+import pytest
+
+from mfm.ai_assist import detect_dataset_type, suggest_dataset_type
+from mfm.synthetic import make_large_synthetic_bundle
+
+# Evidence per demo dataset from headers and values alone (neutral filename)
+DEMO_SCORES = {
+    "production_output": {"production_output": 2.0},  # qty header; weekly dates are not daily batches
+    "material_purchases": {"material_purchases": 3.0},  # material + kg headers, tonne-scale weights
+    "energy_site": {"energy_site": 3.5},  # kWh headers, kWh above any kg
+    "waste_summary": {"waste_summary": 4.5},  # disposal header, small kg, recycling/landfill values
+}
+
+@pytest.mark.parametrize("dtype", list(DEMO_SCORES))
+def test_demo_datasets_are_detected_from_their_content(make_bundle, dtype):
+    df = make_bundle()[dtype]
+    best, confidence, scores = detect_dataset_type("upload.csv", df)
+    assert best == dtype and confidence == 1.0
+    assert scores == {**dict.fromkeys(DEMO_SCORES, 0.0), **DEMO_SCORES[dtype]}
+    assert suggest_dataset_type("upload.csv", df) == dtype
+
+def test_conflicting_filename_lowers_confidence(make_bundle):
+    best, confidence, scores = detect_dataset_type("energy_waste.csv", make_bundle()["material_purchases"])
+    assert best == "material_purchases"
+    assert scores["energy_site"] == 2 and scores["waste_summary"] == 2
+    assert confidence == pytest.approx(3 / 7)
+
+def test_no_evidence_falls_back_to_production_with_zero_confidence():
+    best, confidence, scores = detect_dataset_type("export.csv", pd.DataFrame({"A": [1, 2], "B": ["x", "y"]}))
+    assert (best, confidence) == ("production_output", 0.0)
+    assert not any(scores.values())
+
+def test_interval_meter_readings_add_energy_evidence():
+    energy = make_large_synthetic_bundle(n_production_rows=100, days=3, raw_dates=True)["energy_site"]
+    _, _, scores = detect_dataset_type("upload.csv", energy)
+    assert scores["energy_site"] == 4.5  # headers 3 + kWh values 0.5 + sub-daily steps 1
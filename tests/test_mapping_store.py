@@ -0,0 +1,30 @@
+"""MappingStore: header-normalized round trips and concurrent writers."""
+from concurrent.futures import ThreadPoolExecutor
+
+from mfm.mapping_store import MappingStore, header_signature, normalize_header
+
+COLUMNS = ["Month", "Material Description", "Weight (kg)"]
+MAPPING = {"period": "Month", "material": "Material Description", "mass_kg": "Weight (kg)"}
+
+def test_headers_normalize_to_one_signature():
+    assert normalize_header("  Weight (KG) ") == normalize_header("weight_kg") == "weight kg"
+    assert header_signature(COLUMNS) == header_signature(["weight-KG", " MONTH", "material  description"])
+    assert header_signature(COLUMNS) != header_signature(COLUMNS + ["site_id"])
+
+def test_round_trip_returns_this_files_exact_headers(tmp_path):
+    store = MappingStore(tmp_path)
+    assert store.lookup(COLUMNS) is None
+    store.remember(COLUMNS, "material_purchases", {**MAPPING, "unit": None})
+    renamed = ["WEIGHT_KG", "material description", "month "]
+    dtype, mapping = store.lookup(renamed)
+    assert dtype == "material_purchases"
+    assert mapping == {"period": "month ", "material": "material description", "mass_kg": "WEIGHT_KG", "unit": None}
+    store.forget(renamed)
+    assert store.lookup(COLUMNS) is None
+
+def test_concurrent_remember_leaves_one_whole_entry(tmp_path):
+    store = MappingStore(tmp_path)
+    with ThreadPoolExecutor(8) as ex:
+        list(ex.map(lambda i: store.remember(COLUMNS, "material_purchases", MAPPING), range(64)))
+    assert [p.name for p in tmp_path.iterdir()] == [f"{header_signature(COLUMNS)}.json"]
+    assert store.lookup(COLUMNS) == ("material_purchases", MAPPING)
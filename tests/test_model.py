@@ -0,0 +1,92 @@
+"""compute_balances must keep producing what it did before the baseline/scenario split."""
+import pandas as pd
+import pytest
+
+from mfm.model import apply_scenario, build_flow_model, compute_balances, compute_baseline
+
+FULL_SCENARIO = {
+    "scrap_reduction_pct": 20.0,
+    "yield_improve_pct": 5.0,
+    "energy_intensity_improve_pct": 10.0,
+    "allocate_energy": True,
+}
+
+OPPORTUNITIES = [
+    "High clean metal scrap: consider closed-loop recycling with supplier or local reprocessor.",
+    "Mixed waste is significant: segregation could increase recycling rate and reduce disposal cost.",
+    "Hazardous/sludge stream: review upstream process controls and chemical use to reduce generation.",
+]
+
+ALLOC = {
+    "Process": ["Laser cutting", "Press brake", "Welding", "Powder coating"],
+    "Electricity_kWh": [25105, 25924, 26742, 24559],
+    "Gas_kWh": [13888, 14341, 14794, 13586],
+}
+
+# Output of the single-pass compute_balances (baseline commit) on the bundle below.
+EXPECTED = [
+    (1, {}, {
+        "mat_in_kg": 35800.0, "prod_out_kg": 74925.0, "waste_out_kg": 4470.0, "unaccounted_kg": 0.0,
+        "material_eff_pct": 209.28770949720672, "waste_intensity": 0.05965965965965966,
+        "energy_elec_kwh": 113700.0, "energy_gas_kwh": 62900.0,
+        "energy_intensity_kwh_per_kg": 2.357023690357024,
+        "diversion_pct": 71.58836689038031, "diverted_kg": 3200.0,
+    }, [35800.0, 31330.0, 31330.0, 31330.0, 74925.0, 4470.0, 0.0, 0.0], None),
+    (1, FULL_SCENARIO, {
+        "mat_in_kg": 35800.0, "prod_out_kg": 78671.25, "waste_out_kg": 3576.0, "unaccounted_kg": 0.0,
+        "material_eff_pct": 219.75209497206706, "waste_intensity": 0.045454978788312124,
+        "energy_elec_kwh": 102330.0, "energy_gas_kwh": 56610.0,
+        "energy_intensity_kwh_per_kg": 2.02030602030602,
+        "diversion_pct": 71.58836689038031, "diverted_kg": 2560.0,
+    }, [35800.0, 32224.0, 32224.0, 32224.0, 78671.25, 3576.0, 0.0, 0.0], ALLOC),
+    (3, {}, {
+        "mat_in_kg": 35800.0, "prod_out_kg": 24930.0, "waste_out_kg": 4470.0, "unaccounted_kg": 6400.0,
+        "material_eff_pct": 69.63687150837988, "waste_intensity": 0.1793020457280385,
+        "energy_elec_kwh": 113700.0, "energy_gas_kwh": 62900.0,
+        "energy_intensity_kwh_per_kg": 7.08383473726434,
+        "diversion_pct": 71.58836689038031, "diverted_kg": 3200.0,
+    }, [35800.0, 24930.0, 24930.0, 24930.0, 24930.0, 4470.0, 3840.0, 2560.0], None),
+    (3, FULL_SCENARIO, {
+        "mat_in_kg": 35800.0, "prod_out_kg": 26176.5, "waste_out_kg": 3576.0, "unaccounted_kg": 6047.5,
+        "material_eff_pct": 73.11871508379888, "waste_intensity": 0.1366110824594579,
+        "energy_elec_kwh": 102330.0, "energy_gas_kwh": 56610.0,
+        "energy_intensity_kwh_per_kg": 6.071858346226577,
+        "diversion_pct": 71.58836689038031, "diverted_kg": 2560.0,
+    }, [35800.0, 26176.5, 26176.5, 26176.5, 26176.5, 3576.0, 3628.5, 2419.0], ALLOC),
+]
+
+def make_model(blocks, bundle, sc):
+    return build_flow_model("Site", "Goods in", "Dispatch", blocks, bundle, "Q1", dict(sc))
+
+@pytest.mark.parametrize("qty_divisor, sc, kpis, flow_kg, alloc", EXPECTED)
+def test_compute_balances_matches_single_pass_output(blocks, make_bundle, qty_divisor, sc, kpis, flow_kg, alloc):
+    r = compute_balances(make_model(blocks, make_bundle(qty_divisor), sc))
+    for key, value in kpis.items():
+        assert r[key] == pytest.approx(value), key
+    assert r["flows_table"]["kg"].tolist() == pytest.approx(flow_kg)
+    assert r["opportunities"] == OPPORTUNITIES
+    if alloc is None:
+        assert r["energy_alloc_table"] is None
+    else:
+        assert r["energy_alloc_table"].to_dict("list") == alloc
+
+@pytest.mark.parametrize("sc", [{}, FULL_SCENARIO])
+def test_apply_scenario_on_shared_baseline_matches_compute_balances(blocks, make_bundle, sc):
+    model = make_model(blocks, make_bundle(3), sc)
+    baseline = compute_baseline(model)
+    direct = compute_balances(model)
+    staged = apply_scenario(baseline, dict(sc))
+    for key in EXPECTED[0][2]:
+        assert staged[key] == pytest.approx(direct[key]), key
+    pd.testing.assert_frame_equal(staged["flows_table"], direct["flows_table"])
+    assert staged["ai_messages"] == direct["ai_messages"]
+    assert staged["assumptions"] == direct["assumptions"]
+
+def test_baseline_does_not_follow_later_block_edits(blocks, make_bundle):
+    labels = [b["user_label"] for b in blocks]
+    baseline = compute_baseline(make_model(blocks, make_bundle(), {}))
+    blocks.append({"name": "Packing", "user_label": "Packing", "type": "packaging", "yield_pct": 99})
+    blocks[0]["user_label"] = "Renamed"
+    r = apply_scenario(baseline, {"allocate_energy": True})
+    assert r["energy_alloc_table"]["Process"].tolist() == labels
+    assert r["flows_table"]["kg"].tolist() == pytest.approx(EXPECTED[0][3])
@@ -0,0 +1,52 @@
+"""parse_upload with mapped usecols/dtype: the pyarrow read and its fallback."""
+import pandas as pd
+import pytest
+
+from mfm.ingest import mapped_read_args, parse_upload
+
+MAPPING = {"period": "Month", "material": "Material Description", "mass_kg": "Weight (kg)"}
+
+def upload(weights):
+    df = pd.DataFrame({"Month": ["Jan", "Feb", "Mar"], "Material Description": ["Sheet", "Tube", "Sheet"],
+                       "Weight (kg)": weights, "Notes": ["a", "b", "c"], "site_id": ["S1", "S1", "S2"]})
+    return df, df.to_csv(index=False).encode()
+
+@pytest.fixture
+def engines(monkeypatch):
+    # Records the engine of every read_csv call parse_upload makes
+    seen, read_csv = [], pd.read_csv
+    def spy(*args, **kwargs):
+        seen.append(kwargs.get("engine", "c"))
+        return read_csv(*args, **kwargs)
+    monkeypatch.setattr(pd, "read_csv", spy)
+    return seen
+
+def test_mapped_read_args_keep_mapped_and_site_columns():
+    df, _ = upload([1.0, 2.0, 3.0])
+    usecols, dtype = mapped_read_args("material_purchases", {**MAPPING, "missing": "Nope"}, df.columns)
+    assert usecols == ["Month", "Material Description", "Weight (kg)", "site_id"]
+    assert dtype == {"Material Description": "category", "Weight (kg)": "float64", "site_id": "category"}
+
+def test_mapped_columns_are_read_with_pyarrow(engines):
+    df, data = upload([12000, 11500, 12300])
+    usecols, dtype = mapped_read_args("material_purchases", MAPPING, df.columns)
+    out = parse_upload("purchases.csv", data, usecols, dtype)
+    assert engines == ["pyarrow"]
+    assert sorted(out.columns) == sorted(usecols)
+    assert out["Weight (kg)"].dtype == "float64"
+    assert isinstance(out["Material Description"].dtype, pd.CategoricalDtype)
+    assert out["Weight (kg)"].tolist() == [12000.0, 11500.0, 12300.0]
+
+def test_text_in_a_numeric_column_falls_back_to_the_default_parser(engines):
+    df, data = upload([12000, "about 11500", 12300])
+    usecols, dtype = mapped_read_args("material_purchases", MAPPING, df.columns)
+    out = parse_upload("purchases.csv", data, usecols, dtype)
+    assert engines == ["pyarrow", "c"]
+    assert list(out.columns) == usecols
+    assert out["Weight (kg)"].astype(str).tolist() == ["12000", "about 11500", "12300"]
+
+def test_without_usecols_every_column_is_read(engines):
+    df, data = upload([1.0, 2.0, 3.0])
+    out = parse_upload("purchases.CSV", data)
+    assert engines == ["c"]
+    assert list(out.columns) == list(df.columns)
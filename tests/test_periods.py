@@ -0,0 +1,47 @@
+"""Per-period alignment of month names ("Jan") with ISO dates and months."""
+import pandas as pd
+import pytest
+
+from mfm.ingest import canonicalize_bundle
+from mfm.model import build_flow_model, build_time_index, compute_period_baseline
+
+def model_for(bundle, blocks):
+    return build_flow_model("Site", "In", "Out", blocks, bundle, "Month", {})
+
+def test_month_names_take_the_year_of_dated_datasets(blocks, make_bundle):
+    bundle = make_bundle()
+    bundle["energy_site"]["Month"] = ["2025-01", "2025-02", "2025-03"]  # ISO months next to "Jan" labels
+    pb = compute_period_baseline(model_for(bundle, blocks))
+    table = pb["totals"]
+    assert list(table.index.astype(str)) == ["2025-01", "2025-02", "2025-03"]
+    assert table["mat_in"].tolist() == [12000, 11500, 12300]
+    assert table["elec"].tolist() == [38000, 36500, 39200]
+    assert table["qty"].tolist() == [480 + 510 + 495 + 470, 520 + 505 + 490, 515 + 500 + 510]
+    assert any("read as 2025" in a and "material_purchases" in a for a in pb["assumptions"])
+    assert not any("energy_site" in a and "read as" in a for a in pb["assumptions"])
+
+def test_explicit_year_wins_without_a_note(blocks, make_bundle):
+    pb = compute_period_baseline(model_for(make_bundle(), blocks), year=2024)
+    periods = pb["totals"].index.astype(str)
+    assert {"2024-01", "2024-02", "2024-03", "2025-01"} <= set(periods)
+    assert not any("read as" in a for a in pb["assumptions"])
+
+def test_month_names_without_any_dated_dataset_are_left_out(blocks, make_bundle):
+    bundle = make_bundle()
+    bundle["production_output"] = pd.DataFrame({"Month": ["Jan", "Feb"], "Qty Produced": [100, 200]})
+    pb = compute_period_baseline(model_for(bundle, blocks))
+    assert pb["totals"].empty
+    assert any("without a year" in a for a in pb["assumptions"])
+    assert build_time_index(bundle) == {}
+
+def test_canonical_bundle_gives_the_same_period_table(blocks, make_bundle):
+    raw = compute_period_baseline(model_for(make_bundle(), blocks))
+    canon = compute_period_baseline(model_for(canonicalize_bundle(make_bundle()), blocks))
+    pd.testing.assert_frame_equal(raw["totals"], canon["totals"], check_dtype=False, check_exact=False)
+    assert raw["assumptions"] != [] and len(raw["assumptions"]) == len(canon["assumptions"])
+
+@pytest.mark.parametrize("freq", ["Q", "W"])
+def test_other_frequencies_keep_totals(blocks, make_bundle, freq):
+    table = compute_period_baseline(model_for(make_bundle(), blocks), freq=freq)["totals"]
+    assert table["mat_in"].sum() == pytest.approx(35800)
+    assert table["qty"].sum() == 4995
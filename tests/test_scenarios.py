@@ -0,0 +1,54 @@
+"""Vectorized scenario evaluation agrees with apply_scenario point by point."""
+import itertools
+
+import numpy as np
+import pytest
+
+from mfm.model import (SCENARIO_DOMAIN, apply_scenario, build_flow_model, build_scenario_lattice, compute_baseline,
+                       lattice_lookup, sweep_scenarios)
+
+KPIS = ["prod_out_kg", "waste_out_kg", "unaccounted_kg", "energy_elec_kwh", "energy_gas_kwh", "diverted_kg",
+        "material_eff_pct", "waste_intensity", "energy_intensity_kwh_per_kg", "diversion_pct"]
+
+@pytest.fixture(params=[1, 3], ids=["no-loss", "loss"])
+def baseline(request, blocks, make_bundle):
+    return compute_baseline(build_flow_model("Site", "In", "Out", blocks, make_bundle(request.param), "Q1", {}))
+
+def test_sweep_grid_matches_apply_scenario(baseline):
+    scrap, yld, energy = [0.0, 12.5, 30.0], [0.0, 5.0], [0.0, 7.0, 20.0]
+    grid = np.meshgrid(scrap, yld, energy, indexing="ij")
+    swept = sweep_scenarios(baseline, *grid)
+    for i, j, k in itertools.product(range(len(scrap)), range(len(yld)), range(len(energy))):
+        r = apply_scenario(baseline, {"scrap_reduction_pct": scrap[i], "yield_improve_pct": yld[j],
+                                      "energy_intensity_improve_pct": energy[k]})
+        for key in KPIS:
+            assert swept[key][i, j, k] == pytest.approx(r[key]), (key, scrap[i], yld[j], energy[k])
+
+def test_sweep_broadcasts_scalars(baseline):
+    swept = sweep_scenarios(baseline, scrap_reduction_pct=[0.0, 10.0, 20.0], yield_improve_pct=5.0)
+    assert swept["waste_out_kg"].shape == (3,)
+    assert np.all(swept["yield_improve_pct"] == 5.0)
+
+@pytest.mark.parametrize("sc", [
+    {},
+    {"scrap_reduction_pct": 30.0, "yield_improve_pct": 15.0, "energy_intensity_improve_pct": 20.0},
+    {"scrap_reduction_pct": 7.0, "yield_improve_pct": 3.0, "energy_intensity_improve_pct": 11.0, "allocate_energy": True},
+])
+def test_lattice_results_equal_direct_apply_scenario(baseline, sc):
+    lattice = build_scenario_lattice(baseline)
+    assert lattice_lookup(lattice, sc) is not None
+    via_lattice = apply_scenario(baseline, sc, lattice=lattice)
+    direct = apply_scenario(baseline, sc)
+    for key in KPIS:
+        assert via_lattice[key] == pytest.approx(direct[key]), key
+    assert via_lattice["flows_table"]["kg"].tolist() == pytest.approx(direct["flows_table"]["kg"].tolist())
+    if sc.get("allocate_energy"):
+        assert via_lattice["energy_alloc_table"].equals(direct["energy_alloc_table"])
+
+def test_lattice_lookup_misses_off_grid_points(baseline):
+    lattice = build_scenario_lattice(baseline)
+    hi = SCENARIO_DOMAIN["scrap_reduction_pct"][1]
+    assert lattice_lookup(lattice, {"scrap_reduction_pct": 2.5}) is None
+    assert lattice_lookup(lattice, {"scrap_reduction_pct": hi + 1}) is None
+    off = apply_scenario(baseline, {"scrap_reduction_pct": 2.5}, lattice=lattice)
+    assert off["waste_out_kg"] == pytest.approx(apply_scenario(baseline, {"scrap_reduction_pct": 2.5})["waste_out_kg"])
@@ -0,0 +1,44 @@
+"""compute_site_balances equals compute_balances on each site's slice."""
+import pandas as pd
+import pytest
+
+from mfm.model import build_flow_model, compute_balances, compute_site_balances
+
+SITES = {"S1": 1, "S2": 3, "S3": 2}  # qty divisor per site, so loss differs between sites
+SCENARIO = {"scrap_reduction_pct": 10.0, "yield_improve_pct": 5.0, "energy_intensity_improve_pct": 8.0}
+KPIS = ["mat_in_kg", "prod_out_kg", "waste_out_kg", "unaccounted_kg", "material_eff_pct", "waste_intensity",
+        "energy_elec_kwh", "energy_gas_kwh", "energy_intensity_kwh_per_kg", "diverted_kg", "diversion_pct"]
+
+@pytest.fixture
+def per_site(make_bundle):
+    return {sid: make_bundle(div) for sid, div in SITES.items()}
+
+def stack(per_site):
+    names = next(iter(per_site.values())).keys()
+    return {name: pd.concat([b[name].assign(site_id=sid) for sid, b in per_site.items()], ignore_index=True)
+            for name in names}
+
+def check_site(kpis, flows, sid, bundle, blocks):
+    r = compute_balances(build_flow_model(sid, "In", "Out", blocks, bundle, "Q1", dict(SCENARIO)))
+    for key in KPIS:
+        assert kpis.loc[sid, key] == pytest.approx(r[key]), (sid, key)
+    site_flows = flows[flows["site_id"] == sid].drop(columns="site_id").reset_index(drop=True)
+    expected = r["flows_table"]
+    assert site_flows[["from", "to", "kind"]].values.tolist() == expected[["from", "to", "kind"]].values.tolist()
+    assert site_flows["kg"].tolist() == pytest.approx(expected["kg"].tolist())
+
+def test_shared_blocks(per_site, blocks):
+    kpis, flows = compute_site_balances(stack(per_site), blocks, SCENARIO, "In", "Out")
+    assert sorted(kpis.index) == sorted(SITES)
+    for sid, bundle in per_site.items():
+        check_site(kpis, flows, sid, bundle, blocks)
+
+def test_blocks_per_site(per_site, blocks):
+    by_site = {"S1": blocks, "S2": blocks[:2], "S3": blocks[1:]}
+    kpis, flows = compute_site_balances(stack(per_site), by_site, SCENARIO, "In", "Out")
+    for sid, bundle in per_site.items():
+        check_site(kpis, flows, sid, bundle, by_site[sid])
+
+def test_missing_site_blocks_named(per_site, blocks):
+    with pytest.raises(ValueError, match="S3"):
+        compute_site_balances(stack(per_site), {"S1": blocks, "S2": blocks}, SCENARIO, "In", "Out")
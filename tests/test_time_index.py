@@ -0,0 +1,33 @@
+"""Date-window totals from the prefix-sum time index."""
+import pandas as pd
+import pytest
+
+from mfm.model import attach_time_index, baseline_for_range, build_flow_model, compute_baseline, time_index_bounds
+
+@pytest.fixture
+def staged(blocks, dated_bundle):
+    baseline = compute_baseline(build_flow_model("Site", "In", "Out", blocks, dated_bundle, "Month", {}))
+    return baseline, attach_time_index(dated_bundle)
+
+def test_bounds_cover_whole_last_month(staged):
+    _, ix = staged
+    assert time_index_bounds(ix) == (pd.Timestamp("2025-01-01"), pd.Timestamp("2025-02-28"))
+
+def test_monthly_rows_are_prorated_by_day(staged):
+    baseline, ix = staged
+    b = baseline_for_range(baseline, ix, "2025-01-02", "2025-02-28")
+    assert b["mat_in_kg"] == pytest.approx(3000.0 + 2800.0)
+    assert b["energy_elec_kwh"] == pytest.approx(300.0 + 280.0)
+    assert b["waste_out_kg"] == pytest.approx(600.0 + 300.0 + 280.0)
+    assert b["prod_out_base_kg"] == pytest.approx(300 * 15.0)
+
+    mid = baseline_for_range(baseline, ix, "2025-01-16", "2025-02-14")
+    assert mid["mat_in_kg"] == pytest.approx(1600.0 + 1400.0)
+
+def test_waste_breakdown_and_opportunities_follow_window(staged):
+    baseline, ix = staged
+    b = baseline_for_range(baseline, ix, "2025-02-01", "2025-02-28")
+    assert b["waste_by_type"]["Waste Type"].tolist() == ["Steel scrap"]
+    assert b["waste_by_type"]["Quantity (kg)"].sum() == pytest.approx(b["waste_out_kg"])
+    assert b["opportunities"] == []
+    assert len(baseline["opportunities"]) == 2
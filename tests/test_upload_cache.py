@@ -0,0 +1,49 @@
+"""ParsedFileCache: content-hash keys and LRU eviction under a memory budget."""
+import pandas as pd
+
+from mfm.ingest import ParsedFileCache
+
+def csv_bytes(n, value=1.0):
+    return pd.DataFrame({"Month": ["Jan"] * n, "Weight (kg)": [value] * n}).to_csv(index=False).encode()
+
+def frame_bytes(data):
+    return ParsedFileCache().get_or_parse("x.csv", data).memory_usage(deep=True).sum()
+
+def test_same_content_under_another_name_is_a_hit():
+    cache = ParsedFileCache()
+    data = csv_bytes(10)
+    first = cache.get_or_parse("march.csv", data)
+    again = cache.get_or_parse("renamed copy.CSV", data)
+    assert again is first
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_different_content_or_columns_parse_separately():
+    cache = ParsedFileCache()
+    a = cache.get_or_parse("a.csv", csv_bytes(10, 1.0))
+    b = cache.get_or_parse("a.csv", csv_bytes(10, 2.0))
+    c = cache.get_or_parse("a.csv", csv_bytes(10, 1.0), usecols=["Weight (kg)"])
+    assert a["Weight (kg)"].iloc[0] == 1.0 and b["Weight (kg)"].iloc[0] == 2.0
+    assert list(c.columns) == ["Weight (kg)"]
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (3, 0, 3)
+
+def test_least_recently_used_entry_is_evicted_first():
+    files = {k: csv_bytes(200, v) for k, v in [("a", 1.0), ("b", 2.0), ("c", 3.0)]}
+    size = frame_bytes(files["a"])
+    cache = ParsedFileCache(budget_bytes=int(size * 2.5))
+    cache.get_or_parse("a.csv", files["a"])
+    cache.get_or_parse("b.csv", files["b"])
+    cache.get_or_parse("a.csv", files["a"])  # a is now the most recent
+    cache.get_or_parse("c.csv", files["c"])  # over budget: b goes
+    assert cache.stats()["entries"] == 2
+    misses = cache.stats()["misses"]
+    cache.get_or_parse("a.csv", files["a"])
+    assert cache.stats()["misses"] == misses
+    cache.get_or_parse("b.csv", files["b"])
+    assert cache.stats()["misses"] == misses + 1
+
+def test_frames_larger_than_the_budget_are_not_cached():
+    cache = ParsedFileCache(budget_bytes=10)
+    df = cache.get_or_parse("big.csv", csv_bytes(50))
+    assert len(df) == 50
+    assert cache.stats()["entries"] == 0 and cache.stats()["used_mb"] == 0
@@ -1,5 +1,6 @@
 import streamlit as st
 import base64
+from functools import lru_cache
 from pathlib import Path
 
 CSS = """
@@ -139,7 +140,9 @@ h1,h2,h3 { letter-spacing: -0.02em; }
 }
 </style>
 """
+@lru_cache(maxsize=None)
 def img_to_data_uri(path: str) -> str:
+    # Static assets: read and base64-encode once per process, not on every rerun
     p = Path(path)
     data = p.read_bytes()
     b64 = base64.b64encode(data).decode("utf-8")